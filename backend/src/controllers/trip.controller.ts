@@ -1,5 +1,6 @@
 import { Request, Response } from 'express';
 import asyncHandler from 'express-async-handler';
+import { mongo } from 'mongoose';
 import { TripModel } from '../models/trip.model';
 import { SampleModel } from '../models/sample.model';
 import { User } from '../types/user.types';
@@ -67,6 +68,51 @@ export const getSamplesForTrip = asyncHandler(async (req: RequestWithUser, res:
   res.json(samples);
 });
 
+// Проріджені ряди прогнозу/факту (predictor-service, fleetml.series).
+// Масиви віддаються base64: t — int64 мс, pred/actual — float32 (мл/с), little-endian.
+export const getPredictionSeries = asyncHandler(async (req: RequestWithUser, res: Response) => {
+  const { id } = req.params;
+  const user = req.user;
+
+  if (!user || !user.companyId) {
+    res.status(401);
+    throw new Error('Not authorized');
+  }
+
+  const trip = await TripModel.findOne({ _id: id, companyId: user.companyId });
+
+  if (!trip) {
+    res.status(404);
+    throw new Error('Trip not found');
+  }
+
+  const filter: Record<string, unknown> = { tripId: trip._id };
+  if (typeof req.query.version === 'string') filter.version = req.query.version;
+  const doc = await SampleModel.db
+    .collection('prediction_series')
+    .findOne(filter, { sort: { updatedAt: -1 } });
+
+  if (!doc) {
+    res.status(404);
+    throw new Error('Prediction series not found');
+  }
+
+  // найменший рівень, що має щонайменше `points` точок (інакше — найдетальніший)
+  const points = Number(req.query.points) || 0;
+  const levels = doc.levels as { points: number; t: mongo.Binary; pred: mongo.Binary; actual: mongo.Binary }[];
+  const level = levels.find((l) => l.points >= points) ?? levels[levels.length - 1];
+
+  res.json({
+    version: doc.version,
+    numSamples: doc.numSamples,
+    levels: levels.map((l) => l.points),
+    points: level.points,
+    t: level.t.toString('base64'),
+    pred: level.pred.toString('base64'),
+    actual: level.actual.toString('base64'),
+  });
+});
+
 export const reanalyzeTrip = asyncHandler(async (req: RequestWithUser, res: Response) => {
   const { id } = req.params;
   const user = req.user;
@@ -107,6 +153,10 @@ export const deleteTrip = asyncHandler(async (req: RequestWithUser, res: Respons
   }
 
   await SampleModel.deleteMany({ tripId: id });
+  // колонкові бакети (fleetml.buckets) для скомпактованих трипів
+  await SampleModel.db.collection('sample_buckets').deleteMany({ tripId: trip._id });
+  await SampleModel.db.collection('prediction_series').deleteMany({ tripId: trip._id });
+  await SampleModel.db.collection('prediction_versions').deleteMany({ tripId: trip._id });
   await TripModel.deleteOne({ _id: id });
 
   res.status(200).json({ message: 'Trip deleted' });
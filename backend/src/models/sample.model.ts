@@ -45,4 +45,7 @@ const SampleSchema = new Schema<ISample>({
   }
 });
 
+// predictor рахує ключ кешу (count + останній timestamp трипу) і читає семпли трипу за цим індексом
+SampleSchema.index({ tripId: 1, timestamp: 1 });
+
 export const SampleModel = model<ISample>('Sample', SampleSchema);
@@ -1,5 +1,5 @@
 import { Router } from 'express';
-import { getTrips, getTripById, getSamplesForTrip, reanalyzeTrip, deleteTrip } from '../controllers/trip.controller';
+import { getTrips, getTripById, getSamplesForTrip, getPredictionSeries, reanalyzeTrip, deleteTrip } from '../controllers/trip.controller';
 import { protect } from '../middleware/auth.middleware';
 
 const router = Router();
@@ -7,6 +7,7 @@ const router = Router();
 router.route('/').get(protect, getTrips);
 router.route('/:id').get(protect, getTripById).delete(protect, deleteTrip);
 router.route('/:id/samples').get(protect, getSamplesForTrip);
+router.route('/:id/prediction-series').get(protect, getPredictionSeries);
 router.route('/:id/reanalyze').post(protect, reanalyzeTrip);
 
 export default router;
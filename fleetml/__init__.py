@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""
+Спільний код для model-trainer і predictor-service.
+
+У контейнерах пакет копіюється поруч з app.py / predictor.py (/app/fleetml),
+локально — запускати сервіси з PYTHONPATH, що містить корінь репозиторію.
+"""
+from .features import (
+    FEATURE_COLS, FEATURE_VERSION, FeatureParams,
+    build_serving_features, build_training_features, flatten_samples,
+)
+from .resample import resample_fixed_rate
+
+__all__ = [
+    "FEATURE_COLS", "FEATURE_VERSION", "FeatureParams",
+    "build_serving_features", "build_training_features", "flatten_samples",
+    "resample_fixed_rate",
+]
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Компакція samples у бакети по трипу (колекція sample_buckets).
+
+Один бакет — до BUCKET_SIZE семплів одного трипу, кожне поле лежить
+окремим бінарним масивом фіксованого типу (little-endian):
+  timestamp           int64 (мс від epoch)
+  gps_latitude/longitude  float64
+  решта (altitude, OBD)   float32
+Відсутні значення — NaN. Читачі (trainer, predictor) беруть бакети, якщо вони є,
+і падають назад на сирі samples для трипів без бакетів.
+
+Запуск компакції завершених трипів:
+  python -m fleetml.buckets --mongo mongodb://mongo:27017 --db fleetms [--delete-raw]
+"""
+import argparse
+import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .features import flatten_samples
+
+BUCKETS_COLLECTION = "sample_buckets"
+BUCKET_FORMAT = 1
+BUCKET_SIZE = 2048
+
+COLUMN_DTYPES: Dict[str, str] = {
+    "timestamp":     "<i8",
+    "gps_latitude":  "<f8",
+    "gps_longitude": "<f8",
+    "gps_altitude":  "<f4",
+    "obd_speed":     "<f4",
+    "obd_rpm":       "<f4",
+    "obd_throttle":  "<f4",
+    "coolantC":      "<f4",
+    "intakeC":       "<f4",
+    "fuelRate":      "<f4",
+}
+
+
+def _ms_to_dt(ms: int) -> datetime.datetime:
+    return datetime.datetime(1970, 1, 1) + datetime.timedelta(milliseconds=int(ms))
+
+
+def encode_buckets(trip_id: Any, df_flat: pd.DataFrame, size: int = BUCKET_SIZE) -> List[Dict[str, Any]]:
+    """Плоский фрейм одного трипу -> список документів-бакетів (відсортовано за часом)."""
+    from bson.binary import Binary
+
+    ts = pd.to_datetime(df_flat["timestamp"], utc=True, errors="coerce")
+    df = df_flat.loc[ts.notna().to_numpy()].assign(timestamp=ts[ts.notna()])
+    df = df.sort_values("timestamp", kind="stable")
+    ms = df["timestamp"].astype("int64").to_numpy() // 1_000_000
+    out = []
+    for seq, lo in enumerate(range(0, len(df), size)):
+        hi = min(lo + size, len(df))
+        cols = {"timestamp": Binary(ms[lo:hi].astype("<i8").tobytes())}
+        for name, dt in COLUMN_DTYPES.items():
+            if name == "timestamp":
+                continue
+            v = pd.to_numeric(df[name].iloc[lo:hi], errors="coerce").to_numpy(dtype=float) if name in df else np.full(hi - lo, np.nan)
+            cols[name] = Binary(v.astype(dt).tobytes())
+        out.append({
+            "tripId": trip_id,
+            "seq": seq,
+            "n": hi - lo,
+            "tMin": _ms_to_dt(ms[lo]),
+            "tMax": _ms_to_dt(ms[hi - 1]),
+            "fmt": BUCKET_FORMAT,
+            "cols": cols,
+        })
+    return out
+
+
+def decode_buckets(buckets: Iterable[Dict[str, Any]]) -> pd.DataFrame:
+    """Бакети (будь-яких трипів) -> плоский фрейм як у trainer-і: tripId, timestamp, gps_*, obd_*, ..."""
+    parts = []
+    for b in buckets:
+        n = int(b["n"])
+        cols = {name: np.frombuffer(b["cols"][name], dtype=dt, count=n) for name, dt in COLUMN_DTYPES.items()
+                if name in b["cols"]}
+        part = pd.DataFrame({k: v.astype(float) if k != "timestamp" else v for k, v in cols.items()})
+        part["timestamp"] = pd.to_datetime(cols["timestamp"], unit="ms", utc=True)
+        part.insert(0, "tripId", [b["tripId"]] * n)
+        parts.append(part)
+    if not parts:
+        return pd.DataFrame(columns=["tripId"] + list(COLUMN_DTYPES))
+    return pd.concat(parts, ignore_index=True)
+
+
+def load_bucketed(collection, trip_ids: List[Any]) -> Tuple[pd.DataFrame, Set[Any]]:
+    """(плоский фрейм з бакетів, множина tripId, для яких бакети знайдено)."""
+    if not trip_ids:
+        return decode_buckets([]), set()
+    cursor = collection.find({"tripId": {"$in": list(trip_ids)}}).sort([("tripId", 1), ("seq", 1)])
+    buckets = list(cursor)
+    return decode_buckets(buckets), {b["tripId"] for b in buckets}
+
+
+def bucket_stats(collection, trip_ids: List[Any]) -> Optional[Tuple[int, datetime.datetime]]:
+    """(кількість семплів, максимальний timestamp) з метаданих бакетів; None — бакетів нема."""
+    rows = list(collection.find({"tripId": {"$in": list(trip_ids)}}, {"n": 1, "tMax": 1}))
+    if not rows:
+        return None
+    return sum(int(r["n"]) for r in rows), max(r["tMax"] for r in rows)
+
+
+def compact_trip(db, trip_id: Any, size: int = BUCKET_SIZE, delete_raw: bool = False) -> int:
+    """
+    Пакує семпли трипу в бакети (замінює наявні). Повертає кількість семплів.
+    delete_raw=True видаляє сирі samples — лише якщо їх більше ніхто не читає
+    (backend /trips/:id/samples і analysis-service досі працюють із сирими).
+    """
+    rows = list(db["samples"].find({"tripId": trip_id}).sort("timestamp", 1))
+    if not rows:
+        return 0
+    buckets = encode_buckets(trip_id, flatten_samples(pd.json_normalize(rows)), size)
+    col = db[BUCKETS_COLLECTION]
+    col.delete_many({"tripId": trip_id})
+    col.insert_many(buckets)
+    n = sum(b["n"] for b in buckets)
+    db["trips"].update_one({"_id": trip_id}, {"$set": {"sampleBuckets": {
+        "buckets": len(buckets), "numSamples": n, "format": BUCKET_FORMAT,
+        "compactedAt": datetime.datetime.utcnow(),
+    }}})
+    if delete_raw:
+        db["samples"].delete_many({"tripId": trip_id})
+    return n
+
+
+def compact_finished_trips(db, size: int = BUCKET_SIZE, delete_raw: bool = False, limit: int = 0) -> int:
+    db[BUCKETS_COLLECTION].create_index([("tripId", 1), ("seq", 1)], unique=True)
+    q = {"status": "completed", "sampleBuckets": {"$exists": False}}
+    done = 0
+    for trip in db["trips"].find(q, {"_id": 1}).limit(limit):
+        n = compact_trip(db, trip["_id"], size=size, delete_raw=delete_raw)
+        print(f"[compact] trip={trip['_id']} samples={n}")
+        done += 1
+    return done
+
+
+def main():
+    from pymongo import MongoClient
+
+    ap = argparse.ArgumentParser("Compact finished trips' samples into columnar buckets")
+    ap.add_argument("--mongo", default="mongodb://mongo:27017")
+    ap.add_argument("--db", default="fleetms")
+    ap.add_argument("--bucket-size", type=int, default=BUCKET_SIZE)
+    ap.add_argument("--limit", type=int, default=0)
+    ap.add_argument("--delete-raw", action="store_true")
+    args = ap.parse_args()
+    db = MongoClient(args.mongo)[args.db]
+    n = compact_finished_trips(db, size=args.bucket_size, delete_raw=args.delete_raw, limit=args.limit)
+    print(f"[compact] {n} trips compacted")
+
+
+if __name__ == "__main__":
+    main()
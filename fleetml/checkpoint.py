@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Чекпойнти етапів тренувального джоба (model-trainer) у каталозі версії моделі.
+
+  {out_dir}/checkpoint/state.json     ключ джоба, останній завершений етап, епохи
+  {out_dir}/checkpoint/samples.npz    завантажені семпли (колонками)
+  {out_dir}/checkpoint/features.npz   матриця ознак (+ features.json: колонки, скетчі)
+  {out_dir}/checkpoint/model.joblib   модель після останньої порції епох
+
+Усі файли пишуться через тимчасовий файл і os.replace, тож обірваний запис не
+псує попередній чекпойнт. Ключ джоба (трипи + параметри ознак) не збігся —
+чекпойнт скидається: продовжувати можна лише той самий джоб.
+"""
+import json
+import os
+import shutil
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+STAGES = ("samples", "features", "fit", "completed")
+
+_META = "__columns__"
+
+
+def save_frame(path: str, df: pd.DataFrame) -> None:
+    """DataFrame -> npz без pickle: числа як є, datetime — int64 нс, ObjectId/рядки — str."""
+    from bson import ObjectId
+
+    arrays: Dict[str, np.ndarray] = {}
+    kinds = []
+    for i, col in enumerate(df.columns):
+        s = df[col]
+        if pd.api.types.is_datetime64_any_dtype(s):
+            tz = str(s.dt.tz) if s.dt.tz is not None else None
+            arr = (s.dt.tz_convert("UTC").dt.tz_localize(None) if tz else s).to_numpy("datetime64[ns]").view(np.int64)
+            kinds.append([col, "dt", tz])
+        elif pd.api.types.is_bool_dtype(s) or pd.api.types.is_numeric_dtype(s):
+            arr = s.to_numpy()
+            kinds.append([col, "num", None])
+        else:
+            is_oid = len(s) > 0 and all(isinstance(v, ObjectId) for v in s.iloc[:64])
+            arr = s.astype(str).to_numpy(dtype=str)
+            kinds.append([col, "oid" if is_oid else "str", None])
+        arrays[f"c{i}"] = arr
+    arrays[_META] = np.array(json.dumps(kinds))
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+
+def load_frame(path: str) -> pd.DataFrame:
+    from bson import ObjectId
+
+    with np.load(path, allow_pickle=False) as z:
+        kinds = json.loads(str(z[_META]))
+        data = {}
+        for i, (col, kind, tz) in enumerate(kinds):
+            arr = z[f"c{i}"]
+            if kind == "dt":
+                s = pd.Series(arr.view("datetime64[ns]"))
+                data[col] = s.dt.tz_localize("UTC").dt.tz_convert(tz) if tz else s
+            elif kind == "oid":
+                data[col] = [ObjectId(v) for v in arr]
+            else:
+                data[col] = arr
+    return pd.DataFrame(data)
+
+
+class TrainCheckpoint:
+    """
+    on_mark(stage, info) викликається після кожного зафіксованого етапу
+    (trainer пише його в маніфест моделі як checkpoint).
+    """
+
+    def __init__(self, root: str, key: str,
+                 on_mark: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        self.root = root
+        self.key = key
+        self.on_mark = on_mark
+        self.state: Dict[str, Any] = {}
+        path = os.path.join(root, "state.json")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.state = json.load(f)
+        if self.state.get("key") != key:
+            self.clear()
+        os.makedirs(root, exist_ok=True)
+
+    @property
+    def stage(self) -> Optional[str]:
+        return self.state.get("stage")
+
+    def done(self, stage: str) -> bool:
+        """Чи етап stage (або пізніший) уже завершений."""
+        return self.stage is not None and STAGES.index(self.stage) >= STAGES.index(stage)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _write_json(self, name: str, obj: Any) -> None:
+        tmp = self._path(name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False)
+        os.replace(tmp, self._path(name))
+
+    def mark(self, stage: str, **info: Any) -> None:
+        self.state = {**self.state, **info, "key": self.key, "stage": stage}
+        self._write_json("state.json", self.state)
+        if self.on_mark:
+            self.on_mark(stage, {k: v for k, v in self.state.items() if k != "key"})
+
+    def save_frame(self, name: str, df: pd.DataFrame) -> None:
+        save_frame(self._path(name + ".npz"), df)
+
+    def load_frame(self, name: str) -> pd.DataFrame:
+        return load_frame(self._path(name + ".npz"))
+
+    def save_json(self, name: str, obj: Any) -> None:
+        self._write_json(name + ".json", obj)
+
+    def load_json(self, name: str) -> Any:
+        with open(self._path(name + ".json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_model(self, model: Any, **info: Any) -> None:
+        from joblib import dump
+
+        tmp = self._path("model.joblib.tmp")
+        dump(model, tmp)
+        os.replace(tmp, self._path("model.joblib"))
+        self.mark("fit", **info)
+
+    def load_model(self) -> Optional[Any]:
+        """Модель з останньої порції епох (None — етап fit ще не починався)."""
+        if not self.done("fit") or not os.path.exists(self._path("model.joblib")):
+            return None
+        from joblib import load
+
+        return load(self._path("model.joblib"))
+
+    def clear(self) -> None:
+        """Видаляє файли чекпойнта (стан теж — наступний джоб почне з нуля)."""
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.state = {}
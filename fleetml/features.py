@@ -0,0 +1,469 @@
+# -*- coding: utf-8 -*-
+"""
+Спільний векторизований рушій ознак для model-trainer і predictor-service.
+
+Семантика — як у тренувальному build_features (complementary_fuse, фізичні межі
+для GPS, rolling std з ddof=1, grade), щоб ознаки при тренуванні і в проді збігалися.
+Усі обчислення йдуть по відсортованих (tripId, timestamp) масивах; межі трипів
+задаються індексами start/end кожного рядка, тож groupby.apply не потрібен.
+"""
+import os
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Змінюється щоразу, коли змінюється математика ознак (ключ кешів, meta.json моделі)
+FEATURE_VERSION = "1"
+
+FEATURE_COLS: List[str] = [
+    "speedKmh", "accel_ms2", "obd_rpm", "obd_throttle", "coolantC", "intakeC",
+    "speedKmh_mean5", "speedKmh_std5", "accel_ms2_mean5", "accel_ms2_std5",
+    "obd_rpm_mean5", "obd_rpm_std5", "obd_throttle_mean5", "obd_throttle_std5", "grade"
+]
+
+# плоска назва -> шляхи в документі samples (перший наявний виграє)
+RAW_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "gps_latitude":  ("gps.latitude",),
+    "gps_longitude": ("gps.longitude",),
+    "gps_altitude":  ("gps.altitude",),
+    "obd_speed":     ("obd.vehicleSpeed",),
+    "obd_rpm":       ("obd.engineRpm",),
+    "obd_throttle":  ("obd.acceleratorPosition",),
+    "coolantC":      ("obd.engineCoolantTemp",),
+    "intakeC":       ("obd.intakeAirTemp",),
+    "fuelRate":      ("obd.fuelConsumptionRate", "fuelConsumptionRate"),
+}
+
+ROLLING_SIGNALS = ["speedKmh", "accel_ms2", "obd_rpm", "obd_throttle"]
+
+
+@dataclass(frozen=True)
+class FeatureParams:
+    min_speed_kmh: float = 0.0
+    gap_s: float = 6.0
+    alpha: float = 0.6
+    drop_idle: bool = False
+    idle_speed_kmh: float = 0.05
+    idle_fuel_mls: float = 0.005
+    mismatch_kmh: float = 15.0
+    a_accel_max_ms2: float = 6.0
+    a_decel_max_ms2: float = 6.0
+    phys_margin_kmh: float = 5.0
+    gps_same_eps_m: float = 2.0
+    gps_min_span_s: float = 1.5
+    gps_max_span_s: float = 15.0
+    vmax_kmh: float = 160.0
+
+    @classmethod
+    def from_env(cls) -> "FeatureParams":
+        """Ті самі змінні оточення, що і в model-trainer (GAP_S, ALPHA, VMAX_KMH, ...)."""
+        kw = {}
+        for f in fields(cls):
+            raw = os.getenv(f.name.upper())
+            if raw is None:
+                continue
+            kw[f.name] = raw.lower() == "true" if f.type in (bool, "bool") else float(raw)
+        return cls(**kw)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "FeatureParams":
+        """З meta.json моделі; невідомі ключі ігноруються, відсутні — значення за замовчуванням."""
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in (d or {}).items() if k in names})
+
+
+# ==========================
+#   HELPERS
+# ==========================
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    R = 6371.0
+    phi1 = np.radians(lat1); phi2 = np.radians(lat2)
+    dphi = np.radians(lat2 - lat1); dlambda = np.radians(lon2 - lon1)
+    a = np.sin(dphi/2.0)**2 + np.cos(phi1)*np.cos(phi2)*np.sin(dlambda/2.0)**2
+    c = 2*np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return R * c
+
+
+def flatten_samples(df_raw: pd.DataFrame) -> pd.DataFrame:
+    """json_normalize-фрейм семплів (gps.*, obd.*) -> плоскі колонки як у trainer-і."""
+    out = pd.DataFrame(index=df_raw.index)
+    out["tripId"] = df_raw["tripId"] if "tripId" in df_raw.columns else ""
+    out["timestamp"] = df_raw["timestamp"] if "timestamp" in df_raw.columns else pd.NaT
+    for name, paths in RAW_FIELDS.items():
+        col = next((p for p in (name,) + paths if p in df_raw.columns), None)
+        out[name] = pd.to_numeric(df_raw[col], errors="coerce") if col else np.nan
+    return out
+
+
+def _bounds(trip_codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Для кожного рядка — позиції першого і останнього рядка його трипу (масив відсортований)."""
+    n = len(trip_codes)
+    new = np.r_[True, trip_codes[1:] != trip_codes[:-1]] if n else np.zeros(0, dtype=bool)
+    first = np.flatnonzero(new)
+    last = np.r_[first[1:] - 1, n - 1] if n else first
+    run = np.cumsum(new) - 1
+    return first[run], last[run]
+
+
+# rolling рахується блоками рядків: матриця вікон (n, w) не матеріалізується цілком
+ROLLING_BLOCK = 32768
+
+
+def _windows(x: np.ndarray, start: np.ndarray, end: np.ndarray, before: int, after: int,
+             lo: int = 0, hi: int = None) -> np.ndarray:
+    """Матриця (hi-lo, before+after+1) значень вікна для рядків lo:hi; за межами трипу — NaN."""
+    n = len(x)
+    hi = n if hi is None else hi
+    idx = np.arange(lo, hi)[:, None] + np.arange(-before, after + 1)[None, :]
+    valid = (idx >= start[lo:hi, None]) & (idx <= end[lo:hi, None])
+    return np.where(valid, x[np.clip(idx, 0, max(n - 1, 0))], np.nan)
+
+
+def _blocks(n: int):
+    return ((lo, min(n, lo + ROLLING_BLOCK)) for lo in range(0, max(n, 1), ROLLING_BLOCK))
+
+
+def _nan_count(w: np.ndarray) -> np.ndarray:
+    return np.sum(~np.isnan(w), axis=1)
+
+
+def rolling_mean(x, start, end, before, after=0, min_periods=1) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    for lo, hi in _blocks(len(x)):
+        w = _windows(x, start, end, before, after, lo, hi)
+        cnt = _nan_count(w)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            m = np.nansum(w, axis=1) / cnt
+        out[lo:hi] = np.where(cnt >= min_periods, m, np.nan)
+    return out
+
+
+def rolling_std(x, start, end, before, after=0, min_periods=1, ddof=1) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    for lo, hi in _blocks(len(x)):
+        w = _windows(x, start, end, before, after, lo, hi)
+        cnt = _nan_count(w)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            m = np.nansum(w, axis=1) / cnt
+            var = np.nansum((w - m[:, None]) ** 2, axis=1) / (cnt - ddof)
+        out[lo:hi] = np.where((cnt >= min_periods) & (cnt > ddof), np.sqrt(np.maximum(var, 0.0)), np.nan)
+    return out
+
+
+def rolling_median(x, start, end, before, after=0, min_periods=1) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    for lo, hi in _blocks(len(x)):
+        w = _windows(x, start, end, before, after, lo, hi)
+        ok = _nan_count(w) >= min_periods
+        if ok.any():
+            out[lo:hi][ok] = np.nanmedian(w[ok], axis=1)
+    return out
+
+
+def _prev(x: np.ndarray, start: np.ndarray) -> np.ndarray:
+    """shift(1) в межах трипу."""
+    out = np.r_[np.nan, x[:-1]] if len(x) else x.astype(float)
+    out[np.arange(len(x)) == start] = np.nan
+    return out
+
+
+# ==========================
+#   GPS SPEED
+# ==========================
+
+def _first_far(lat, lon, a: int, from_idx: int, eps_m: float) -> int:
+    """Перший індекс >= from_idx, що далі за eps_m від якоря a; -1 якщо такого нема."""
+    n = len(lat)
+    chunk = 32
+    i = from_idx
+    while i < n:
+        j = min(n, i + chunk)
+        d = haversine_km(lat[a], lon[a], lat[i:j], lon[i:j]) * 1000.0
+        hit = np.flatnonzero(np.isfinite(d) & (d > eps_m))
+        if hit.size:
+            return i + int(hit[0])
+        i = j
+        chunk *= 2
+    return -1
+
+
+def _segment_speed(lat, lon, ts, p: FeatureParams) -> np.ndarray:
+    """
+    Якщо координати не змінюються кілька семплів — чекаємо першого з новими координатами
+    і розкидаємо середню швидкість на весь “плоский” відрізок.
+    Послідовні "рухомі" кроки обробляються блоком, цикл лише по плато.
+    """
+    n = len(lat)
+    out = np.full(n, np.nan)
+    if n < 2:
+        return out
+    step_km = haversine_km(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    moving = np.isfinite(step_km) & (step_km * 1000.0 > p.gps_same_eps_m)
+    dt1 = ts[1:] - ts[:-1]
+    span_ok = (dt1 > p.gps_min_span_s) & (dt1 <= p.gps_max_span_s)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        direct = (step_km / dt1) * 3600.0
+    stops = np.flatnonzero(~moving)
+
+    a = 0
+    while a < n - 1:
+        if moving[a]:
+            k = stops[np.searchsorted(stops, a)] if stops.size and stops[-1] >= a else n - 1
+            m = span_ok[a:k]
+            out[a + 1:k + 1][m] = direct[a:k][m]
+            a = int(k)
+            continue
+        j = _first_far(lat, lon, a, a + 2, p.gps_same_eps_m)
+        if j < 0:
+            break
+        dt = ts[j] - ts[a]
+        if (dt > p.gps_min_span_s) and (dt <= p.gps_max_span_s):
+            out[a + 1:j + 1] = (haversine_km(lat[a], lon[a], lat[j], lon[j]) / dt) * 3600.0
+        a = j
+    return out
+
+
+def gps_speed_kmh(lat, lon, ts, start, end, p: FeatureParams) -> np.ndarray:
+    """Сегментна GPS-швидкість + диференційний fallback (dt в (0, gap_s])."""
+    out = np.full(len(lat), np.nan)
+    for s in np.unique(start):
+        e = end[s] + 1
+        out[s:e] = _segment_speed(lat[s:e], lon[s:e], ts[s:e], p)
+
+    prev_ts, prev_lat, prev_lon = _prev(ts, start), _prev(lat, start), _prev(lon, start)
+    dt1 = ts - prev_ts
+    with np.errstate(divide="ignore", invalid="ignore"):
+        v1 = (haversine_km(prev_lat, prev_lon, lat, lon) / dt1) * 3600.0
+    v1[(dt1 <= 0) | (dt1 > p.gap_s)] = np.nan
+    fill = np.isnan(out) & np.isfinite(v1)
+    out[fill] = v1[fill]
+    return out
+
+
+def complementary_fuse(v_obd: np.ndarray, v_gps: np.ndarray,
+                       base_alpha: float = 0.6,
+                       mismatch_thr_kmh: float = 15.0) -> np.ndarray:
+    alpha = np.full(len(v_obd), float(base_alpha), dtype=float)
+    alpha = np.where(np.isnan(v_gps), 0.85, alpha)
+    with np.errstate(invalid="ignore"):
+        mismatch = np.abs(v_obd - v_gps) > mismatch_thr_kmh
+    alpha = np.where(mismatch, np.maximum(alpha, 0.75), alpha)
+    fused = alpha * v_obd + (1.0 - alpha) * v_gps
+    fused = np.where(np.isnan(fused) & ~np.isnan(v_obd), v_obd, fused)
+    fused = np.where(np.isnan(fused) & ~np.isnan(v_gps), v_gps, fused)
+    return fused
+
+
+# ==========================
+#   PIPELINE
+# ==========================
+
+def _sorted_frame(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
+    df = df.dropna(subset=["timestamp"])
+    df = df.sort_values(["tripId", "timestamp"], kind="stable").reset_index(drop=True)
+    for c in RAW_FIELDS:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+    return df
+
+
+def _trip_arrays(df: pd.DataFrame):
+    codes = pd.factorize(df["tripId"], sort=False)[0]
+    start, end = _bounds(codes)
+    ts = df["timestamp"].astype("int64").to_numpy() / 1e9
+    return start, end, ts
+
+
+def speed_arrays(lat: np.ndarray, lon: np.ndarray, v_obd: np.ndarray, ts: np.ndarray,
+                 start: np.ndarray, end: np.ndarray, p: FeatureParams) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(gpsSpeedKmh_raw, gpsSpeedKmh_smooth, speedKmh) для відсортованих масивів."""
+    raw = gps_speed_kmh(lat, lon, ts, start, end, p)
+    med = rolling_median(raw, start, end, 2, 2, min_periods=2)
+    smooth = rolling_mean(med, start, end, 2, 2, min_periods=2)
+    raw = np.minimum(raw, p.vmax_kmh)
+    smooth = np.minimum(smooth, p.vmax_kmh)
+
+    # Фізика: перевіряємо GPS за границями прискорення
+    dt = ts - _prev(ts, start)
+    v_prev = _prev(v_obd, start)
+    v_prev = np.where(np.isnan(v_prev), _prev(smooth, start), v_prev)
+    dt_pos = np.maximum(0.0, dt)
+    lower = np.maximum(0.0, v_prev - dt_pos * p.a_decel_max_ms2 * 3.6) - p.phys_margin_kmh
+    upper = (v_prev + dt_pos * p.a_accel_max_ms2 * 3.6) + p.phys_margin_kmh
+    with np.errstate(invalid="ignore"):
+        out_of_bounds = (smooth < lower) | (smooth > upper)
+    smooth = np.where(out_of_bounds, np.nan, smooth)
+
+    fused = np.minimum(complementary_fuse(v_obd, smooth, p.alpha, p.mismatch_kmh), p.vmax_kmh)
+    return raw, smooth, fused
+
+
+def accel_array(speed_kmh: np.ndarray, ts: np.ndarray, start: np.ndarray, p: FeatureParams) -> np.ndarray:
+    """Прискорення; dt <= 0 (дублікати timestamp) і розриви > gap_s -> NaN."""
+    v_ms = speed_kmh / 3.6
+    dt = ts - _prev(ts, start)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        accel = (v_ms - _prev(v_ms, start)) / dt
+    accel[~(dt > 0) | (dt > p.gap_s)] = np.nan
+    return accel
+
+
+def grade_array(lat: np.ndarray, lon: np.ndarray, alt: np.ndarray, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    dist_m = haversine_km(_prev(lat, start), _prev(lon, start), lat, lon) * 1000.0
+    dh = alt - _prev(alt, start)
+    valid = np.isfinite(dist_m) & (dist_m > 1e-3) & np.isfinite(dh)
+    grade = np.full(len(lat), np.nan)
+    grade[valid] = dh[valid] / dist_m[valid]
+    return rolling_median(grade, start, end, 4)
+
+
+def add_speed_features(df: pd.DataFrame, p: FeatureParams) -> pd.DataFrame:
+    """gpsSpeedKmh_raw / gpsSpeedKmh_smooth / speedKmh (df вже відсортований)."""
+    start, end, ts = _trip_arrays(df)
+    raw, smooth, fused = speed_arrays(df["gps_latitude"].to_numpy(dtype=float),
+                                      df["gps_longitude"].to_numpy(dtype=float),
+                                      df["obd_speed"].to_numpy(dtype=float), ts, start, end, p)
+    df["gpsSpeedKmh_raw"] = raw
+    df["gpsSpeedKmh_smooth"] = smooth
+    df["speedKmh"] = fused
+    return df
+
+
+def add_derived_features(df: pd.DataFrame, p: FeatureParams) -> pd.DataFrame:
+    """accel_ms2, rolling mean/std (вікно 5), grade (df вже відсортований)."""
+    start, end, ts = _trip_arrays(df)
+    df["accel_ms2"] = accel_array(df["speedKmh"].to_numpy(dtype=float), ts, start, p)
+
+    for col in ROLLING_SIGNALS:
+        x = df[col].to_numpy(dtype=float)
+        df[f"{col}_mean5"] = rolling_mean(x, start, end, 4)
+        df[f"{col}_std5"] = rolling_std(x, start, end, 4, ddof=1)
+
+    # Уклон (grade)
+    df["grade"] = grade_array(df["gps_latitude"].to_numpy(dtype=float),
+                              df["gps_longitude"].to_numpy(dtype=float),
+                              df["gps_altitude"].to_numpy(dtype=float), start, end)
+    return df
+
+
+def build_training_features(df: pd.DataFrame,
+                            p: FeatureParams = FeatureParams(),
+                            fill_na: bool = True) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    df — плоскі поля (gps_latitude, ..., fuelRate, tripId, timestamp).
+    Відкидає рядки без часу/GPS/таргету, пропуски в ознаках заповнює медіаною
+    (fill_na=False — лишає NaN, напр. щоб зняти скетчі до заповнення).
+    """
+    df = _sorted_frame(df)
+    df = df.dropna(subset=["tripId", "gps_latitude", "gps_longitude"]).reset_index(drop=True)
+    df = add_speed_features(df, p)
+
+    # Таргет
+    df["y"] = pd.to_numeric(df["fuelRate"], errors="coerce")
+    df = df.dropna(subset=["y"])
+
+    # Прибрати "вимкнений" стан
+    if p.drop_idle:
+        sp = df["speedKmh"].fillna(0).abs() <= float(p.idle_speed_kmh)
+        fu = df["y"].fillna(0).abs() <= float(p.idle_fuel_mls)
+        df = df[~(sp & fu)]
+    df = add_derived_features(df.reset_index(drop=True), p)
+
+    # Мінімальна швидкість (лишити таргет або швидкість вище порогу)
+    if p.min_speed_kmh > 0:
+        df = df[(df["speedKmh"].fillna(0) >= float(p.min_speed_kmh)) | (df["y"].notna())]
+
+    feature_cols = list(FEATURE_COLS)
+    df = df.dropna(subset=feature_cols, how="all")
+    if fill_na:
+        df[feature_cols] = df[feature_cols].fillna(df[feature_cols].median())
+
+    out_cols = ["tripId", "timestamp"] + feature_cols + ["y"]
+    return df[out_cols].reset_index(drop=True), feature_cols
+
+
+def build_serving_features(df_flat: pd.DataFrame, p: FeatureParams = FeatureParams()) -> pd.DataFrame:
+    """
+    Та сама математика без відкидання рядків (окрім рядків без часу):
+    predictor інтегрує прогноз по всіх семплах трипу. Пропуски лишаються NaN.
+    """
+    df = _sorted_frame(df_flat)
+    df = add_speed_features(df, p)
+    return add_derived_features(df, p)
+
+
+def build_serving_matrix(df_flat: pd.DataFrame, feature_cols: List[str],
+                         p: FeatureParams = FeatureParams(),
+                         dtype=np.float32) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Ощадливий варіант build_serving_features для довгих трипів: без копії фрейму
+    і без ~20 проміжних колонок. Сирі сигнали тримаються окремими масивами
+    (координати — float64, решта — float32), ознаки пишуться одразу в
+    преалокований X (n, len(feature_cols)) у порядку feature_cols; у пам'яті
+    одночасно живе лише кілька проміжних масивів довжини n.
+    df_flat може бути і сирим json_normalize-фреймом (назви з RAW_FIELDS).
+    Повертає (X, aux): aux — ts (секунди), speedKmh, obd_speed, fuelRate у порядку рядків X.
+    Ознаки, яких рушій не знає, лишаються NaN.
+    """
+    ts_ns = pd.to_datetime(df_flat["timestamp"], utc=True, errors="coerce").to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    ok = ts_ns != np.iinfo(np.int64).min  # NaT
+    trip = df_flat["tripId"].to_numpy()[ok] if "tripId" in df_flat.columns else np.zeros(ok.sum())
+    codes = pd.factorize(trip, sort=True)[0]
+    perm = np.lexsort((ts_ns[ok], codes))  # стабільно: (tripId, timestamp), як у _sorted_frame
+    order = np.flatnonzero(ok)[perm]
+    start, end = _bounds(codes[perm])
+    ts = ts_ns[order] / 1e9
+
+    def sig(name: str, keep=np.float32) -> np.ndarray:
+        # плоска назва або шлях json_normalize (gps.*, obd.*) — flatten_samples не потрібен
+        col = next((c for c in (name,) + RAW_FIELDS.get(name, ()) if c in df_flat.columns), None)
+        if col is None:
+            return np.full(len(order), np.nan, dtype=keep)
+        return pd.to_numeric(df_flat[col], errors="coerce").to_numpy(dtype=float)[order].astype(keep, copy=False)
+
+    lat, lon = sig("gps_latitude", np.float64), sig("gps_longitude", np.float64)
+    v_obd = sig("obd_speed").astype(float)
+    _, _, speed = speed_arrays(lat, lon, v_obd, ts, start, end, p)
+
+    n = len(order)
+    X = np.full((n, len(feature_cols)), np.nan, dtype=dtype)
+    pos = {c: j for j, c in enumerate(feature_cols)}
+    want = set(feature_cols)
+
+    def put(name: str, values: np.ndarray):
+        if name in pos:
+            X[:, pos[name]] = values
+
+    accel = accel_array(speed, ts, start, p) if want & {"accel_ms2", "accel_ms2_mean5", "accel_ms2_std5"} else None
+    put("speedKmh", speed)
+    if accel is not None:
+        put("accel_ms2", accel)
+    for name in ("obd_rpm", "obd_throttle", "coolantC", "intakeC"):
+        if want & {name, f"{name}_mean5", f"{name}_std5"}:
+            x = sig(name)
+            put(name, x)
+            if name in ROLLING_SIGNALS:
+                x = x.astype(float)
+                if f"{name}_mean5" in pos:
+                    put(f"{name}_mean5", rolling_mean(x, start, end, 4))
+                if f"{name}_std5" in pos:
+                    put(f"{name}_std5", rolling_std(x, start, end, 4, ddof=1))
+    for name, x in (("speedKmh", speed), ("accel_ms2", accel)):
+        if x is not None:
+            if f"{name}_mean5" in pos:
+                put(f"{name}_mean5", rolling_mean(x, start, end, 4))
+            if f"{name}_std5" in pos:
+                put(f"{name}_std5", rolling_std(x, start, end, 4, ddof=1))
+    if "grade" in pos:
+        put("grade", grade_array(lat, lon, sig("gps_altitude").astype(float), start, end))
+
+    aux = {"ts": ts, "speedKmh": speed, "obd_speed": v_obd, "fuelRate": sig("fuelRate").astype(float)}
+    return X, aux
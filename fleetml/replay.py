@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+"""
+Генератор навантаження: replay трипів через бінарний WebSocket-протокол (DataTransferProtocol.md).
+
+Кожен "автомобіль" — окреме з'єднання з власним JWT (backend шукає авто за driverId
+користувача): AUTH_REQ -> CONFIG_REQ -> START_TRIP_REQ -> DATA-кадри -> END_TRIP_REQ.
+Запис — 32 байти big-endian, рівно так, як їх декодує backend/src/websockets/socket.ts
+(увага: lon на зміщенні 8, lat на 12), тож семпли в Mongo збігаються з вихідними
+з точністю до масштабу полів. Кадр — до 63 записів, надсилається в момент часу
+останнього запису, стиснутий у speedup разів (0 — без пауз).
+
+Метрики: затримка ACK (від кадру, що переходить поріг n1 записів, до ACK),
+кадри/записи на секунду, час від END_TRIP_REQ до появи trips.predictionSummary
+(якщо задано --mongo). Підсумок — один JSON-рядок.
+
+  python -m fleetml.replay --url ws://localhost:8000 --user-id <id> [--user-id ...] \
+      --speedup 20 [--source synthetic|mongo] [--mongo mongodb://localhost:27017] [--out replay.jsonl]
+
+Без --token/--tokens-file токени підписуються JWT_SECRET для кожного --user-id (HS256, {id}).
+Залежності інструментів (websockets тощо) — requirements-dev.txt у корені репозиторію.
+"""
+import argparse
+import asyncio
+import base64
+import collections
+import datetime
+import hashlib
+import hmac
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# --- команди CONTROL-кадрів (як CommandType у socket.ts) ---
+AUTH_REQ, AUTH_OK = 0x00, 0x01
+START_TRIP_REQ, START_TRIP_OK = 0x02, 0x03
+END_TRIP_REQ, END_TRIP_OK = 0x06, 0x07
+ACK, ERROR = 0x08, 0x09
+PING, PONG = 0x0A, 0x0B
+CONFIG_REQ, CONFIG_ACK = 0x0E, 0x0F
+
+DATA_FLAG = 0x80
+MAX_RECORDS_PER_FRAME = 63
+RECORD_SIZE = 32
+
+# поле запису -> (плоска колонка flatten_samples, множник); порядок = розкладка запису
+RECORD_FIELDS = {
+    "lon":      ("gps_longitude", 1e7),
+    "lat":      ("gps_latitude", 1e7),
+    "alt":      ("gps_altitude", 100.0),
+    "speed":    ("obd_speed", 100.0),
+    "rpm":      ("obd_rpm", 1.0),
+    "throttle": ("obd_throttle", 10.0),
+    "coolant":  ("coolantC", 100.0),
+    "intake":   ("intakeC", 100.0),
+    "fuel":     ("fuelRate", 100.0),
+}
+RECORD_DTYPE = np.dtype([("timestamp", ">u8"), ("lon", ">i4"), ("lat", ">i4"), ("alt", ">i4"),
+                         ("speed", ">u2"), ("rpm", ">u2"), ("throttle", ">u2"),
+                         ("coolant", ">u2"), ("intake", ">u2"), ("fuel", ">u2")])
+assert RECORD_DTYPE.itemsize == RECORD_SIZE
+
+_EPOCH = pd.Timestamp("1970-01-01", tz="UTC")
+
+
+def encode_records(df_flat: pd.DataFrame) -> np.ndarray:
+    """Плоский фрейм (flatten_samples) -> масив записів RECORD_DTYPE у порядку timestamp."""
+    df = df_flat.sort_values("timestamp", kind="stable")
+    rec = np.zeros(len(df), dtype=RECORD_DTYPE)
+    rec["timestamp"] = (pd.to_datetime(df["timestamp"], utc=True) - _EPOCH) // pd.Timedelta(milliseconds=1)
+    for name, (col, scale) in RECORD_FIELDS.items():
+        info = np.iinfo(RECORD_DTYPE[name])
+        v = np.nan_to_num(pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float) * scale, nan=0.0)
+        # у протоколі нема NaN і від'ємних u16: відсутнє -> 0, решта обрізається до діапазону типу
+        rec[name] = np.clip(np.round(v), info.min, info.max)
+    return rec
+
+
+def decode_records(buf: bytes, trip_id: Any = None) -> pd.DataFrame:
+    """Зворотне до encode_records (як handleDataMessage у backend): плоский фрейм."""
+    rec = np.frombuffer(buf, dtype=RECORD_DTYPE, count=len(buf) // RECORD_SIZE)
+    out = pd.DataFrame({"tripId": trip_id,
+                        "timestamp": pd.to_datetime(rec["timestamp"].astype(np.int64), unit="ms")})
+    for name, (col, scale) in RECORD_FIELDS.items():
+        out[col] = rec[name].astype(float) / scale
+    return out
+
+
+def data_frames(rec: np.ndarray, per_frame: int = MAX_RECORDS_PER_FRAME) -> List[bytes]:
+    """DATA-кадри: заголовок 0x80 | count (6 біт) + count записів."""
+    per_frame = max(1, min(int(per_frame), MAX_RECORDS_PER_FRAME))
+    return [bytes([DATA_FLAG | len(rec[i:i + per_frame])]) + rec[i:i + per_frame].tobytes()
+            for i in range(0, len(rec), per_frame)]
+
+
+def control_frame(command: int, payload: Optional[bytes] = None) -> bytes:
+    """CONTROL-кадр; payload (якщо є) йде з префіксом довжини u16 BE."""
+    if payload is None:
+        return bytes([command])
+    return bytes([command]) + len(payload).to_bytes(2, "big") + payload
+
+
+def _b64url(b: bytes) -> str:
+    return base64.urlsafe_b64encode(b).rstrip(b"=").decode("ascii")
+
+
+def mint_token(user_id: str, secret: str, ttl_s: int = 24 * 3600) -> str:
+    """JWT HS256 з payload {id}, як generateToken у backend (без залежності від PyJWT)."""
+    now = int(time.time())
+    head = _b64url(json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":")).encode())
+    body = _b64url(json.dumps({"id": user_id, "iat": now, "exp": now + ttl_s}, separators=(",", ":")).encode())
+    sig = hmac.new(secret.encode(), f"{head}.{body}".encode(), hashlib.sha256).digest()
+    return f"{head}.{body}.{_b64url(sig)}"
+
+
+def _pct(values: List[float], q: float) -> Optional[float]:
+    return round(float(np.percentile(values, q)), 3) if values else None
+
+
+class ReplayStats:
+    def __init__(self):
+        self.records = 0
+        self.frames = 0
+        self.bytes = 0
+        self.trips = 0
+        self.ack_ms: List[float] = []
+        self.missing_acks = 0
+        self.e2e_s: List[float] = []
+        self.e2e_timeouts = 0
+        self.errors: List[str] = []
+
+    def report(self, wall_s: float, vehicles: int, speedup: float) -> Dict[str, Any]:
+        return {
+            "at": datetime.datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "vehicles": vehicles, "speedup": speedup, "trips": self.trips,
+            "records": self.records, "frames": self.frames, "bytes": self.bytes,
+            "wallS": round(wall_s, 3),
+            "framesPerS": round(self.frames / wall_s, 2) if wall_s > 0 else None,
+            "recordsPerS": round(self.records / wall_s, 2) if wall_s > 0 else None,
+            "acks": len(self.ack_ms), "missingAcks": self.missing_acks,
+            "ackMs": {"p50": _pct(self.ack_ms, 50), "p95": _pct(self.ack_ms, 95),
+                      "p99": _pct(self.ack_ms, 99), "max": _pct(self.ack_ms, 100)},
+            "e2eS": {"n": len(self.e2e_s), "p50": _pct(self.e2e_s, 50), "p95": _pct(self.e2e_s, 95),
+                     "max": _pct(self.e2e_s, 100), "timeouts": self.e2e_timeouts},
+            "errors": self.errors[:20],
+        }
+
+
+class VehicleReplay:
+    """Одне з'єднання: читач кадрів у фоні, керуючі відповіді — через чергу."""
+
+    def __init__(self, url: str, token: str, stats: ReplayStats, speedup: float = 1.0,
+                 per_frame: int = MAX_RECORDS_PER_FRAME, keep_timestamps: bool = False,
+                 trips_col=None, e2e_timeout_s: float = 300.0, reply_timeout_s: float = 30.0):
+        self.url, self.token, self.stats = url, token, stats
+        self.speedup, self.per_frame, self.keep_timestamps = speedup, per_frame, keep_timestamps
+        self.trips_col, self.e2e_timeout_s, self.reply_timeout_s = trips_col, e2e_timeout_s, reply_timeout_s
+        self.n1, self.t1 = 10, 30
+        self.replies: "asyncio.Queue[bytes]" = asyncio.Queue()
+        # дзеркало receivedFramesSinceAck сервера: лічильник записів і час кадрів, що чекають ACK
+        self.since_ack = 0
+        self.pending_acks: "collections.deque[float]" = collections.deque()
+        self.e2e_tasks: List[asyncio.Task] = []
+
+    async def _reader(self, ws):
+        async for msg in ws:
+            if not isinstance(msg, bytes) or not msg:
+                continue
+            if msg[0] == ACK:
+                if self.pending_acks:
+                    self.stats.ack_ms.append((time.perf_counter() - self.pending_acks.popleft()) * 1000.0)
+            elif msg[0] != PONG:
+                await self.replies.put(msg)
+
+    async def _request(self, ws, frame: bytes, expect: int) -> bytes:
+        await ws.send(frame)
+        reply = await asyncio.wait_for(self.replies.get(), self.reply_timeout_s)
+        if reply[0] == ERROR:
+            n = int.from_bytes(reply[2:4], "big")
+            raise RuntimeError(f"server ERROR 0x{reply[1]:02x}: {reply[4:4 + n].decode('utf-8', 'replace')}")
+        if reply[0] != expect:
+            raise RuntimeError(f"expected 0x{expect:02x}, got 0x{reply[0]:02x}")
+        return reply
+
+    async def _keepalive(self, ws):
+        while True:
+            await asyncio.sleep(self.t1)
+            await ws.send(control_frame(PING))
+
+    async def _wait_summary(self, trip_id: str, t_end: float):
+        from bson import ObjectId
+
+        deadline = t_end + self.e2e_timeout_s
+        while time.perf_counter() < deadline:
+            doc = await asyncio.to_thread(self.trips_col.find_one,
+                                          {"_id": ObjectId(trip_id), "predictionSummary": {"$exists": True}},
+                                          {"_id": 1})
+            if doc:
+                self.stats.e2e_s.append(time.perf_counter() - t_end)
+                return
+            await asyncio.sleep(0.5)
+        self.stats.e2e_timeouts += 1
+
+    async def _send_trip(self, ws, rec: np.ndarray):
+        if not self.keep_timestamps and len(rec):
+            # трип "відбувається зараз": зсув часу, інтервали між семплами лишаються вихідними
+            rec = rec.copy()
+            rec["timestamp"] = rec["timestamp"] - rec["timestamp"][0] + int(time.time() * 1000)
+        ts = rec["timestamp"].astype(np.int64)
+        t0 = time.perf_counter()
+        for i, frame in enumerate(data_frames(rec, self.per_frame)):
+            count = frame[0] & 0x3F
+            if self.speedup > 0:
+                last = ts[min((i + 1) * self.per_frame, len(ts)) - 1]
+                delay = t0 + (last - ts[0]) / 1000.0 / self.speedup - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await ws.send(frame)
+            self.since_ack += count
+            if self.since_ack >= self.n1:
+                self.pending_acks.append(time.perf_counter())
+                self.since_ack = 0
+            self.stats.frames += 1
+            self.stats.records += count
+            self.stats.bytes += len(frame)
+
+    async def run(self, trips: List[np.ndarray]):
+        import websockets
+
+        async with websockets.connect(self.url, max_size=None) as ws:
+            reader = asyncio.create_task(self._reader(ws))
+            keepalive = None
+            try:
+                await self._request(ws, control_frame(AUTH_REQ, self.token.encode("utf-8")), AUTH_OK)
+                cfg = await self._request(ws, control_frame(CONFIG_REQ), CONFIG_ACK)
+                self.n1 = int.from_bytes(cfg[3:5], "big")
+                self.t1 = int.from_bytes(cfg[5:7], "big") or self.t1
+                keepalive = asyncio.create_task(self._keepalive(ws))
+                for rec in trips:
+                    started = await self._request(ws, control_frame(START_TRIP_REQ), START_TRIP_OK)
+                    trip_id = started[3:3 + int.from_bytes(started[1:3], "big")].hex()
+                    await self._send_trip(ws, rec)
+                    t_end = time.perf_counter()
+                    await self._request(ws, control_frame(END_TRIP_REQ), END_TRIP_OK)
+                    self.stats.trips += 1
+                    if self.trips_col is not None:
+                        self.e2e_tasks.append(asyncio.create_task(self._wait_summary(trip_id, t_end)))
+                # ACK-и, що ще в дорозі, мають шанс дійти до закриття з'єднання
+                for _ in range(20):
+                    if not self.pending_acks:
+                        break
+                    await asyncio.sleep(0.1)
+                self.stats.missing_acks += len(self.pending_acks)
+            finally:
+                for task in (reader, keepalive):
+                    if task:
+                        task.cancel()
+        if self.e2e_tasks:
+            await asyncio.gather(*self.e2e_tasks)
+
+
+async def run_replay(url: str, tokens: List[str], trips: List[np.ndarray], trips_per_vehicle: int = 1,
+                     speedup: float = 1.0, ramp_s: float = 0.0, **kwargs) -> Dict[str, Any]:
+    """Трипи роздаються автомобілям по колу; старти рівномірно розносяться на ramp_s секунд."""
+    stats = ReplayStats()
+
+    async def one(i: int, token: str):
+        if ramp_s > 0 and len(tokens) > 1:
+            await asyncio.sleep(ramp_s * i / (len(tokens) - 1))
+        mine = [trips[(i * trips_per_vehicle + k) % len(trips)] for k in range(trips_per_vehicle)]
+        try:
+            await VehicleReplay(url, token, stats, speedup=speedup, **kwargs).run(mine)
+        except Exception as e:
+            stats.errors.append(f"vehicle {i}: {type(e).__name__}: {e}")
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i, tok) for i, tok in enumerate(tokens)))
+    return stats.report(time.perf_counter() - t0, len(tokens), speedup)
+
+
+def synthetic_records(n_trips: int, n: int, seed: int = 0) -> List[np.ndarray]:
+    from .features import flatten_samples
+    from .synthetic import synthetic_trip
+
+    return [encode_records(flatten_samples(pd.json_normalize(synthetic_trip(n, trip_id=f"replay-{k}", seed=seed + k))))
+            for k in range(n_trips)]
+
+
+def mongo_records(db, trip_ids: List[str], limit: int = 10) -> List[np.ndarray]:
+    """Семпли завершених трипів (бакети, якщо трип скомпактований, інакше сирі samples)."""
+    from bson import ObjectId
+
+    from .buckets import BUCKETS_COLLECTION, load_bucketed
+    from .features import flatten_samples
+
+    if trip_ids:
+        ids = [ObjectId(t) if ObjectId.is_valid(t) else t for t in trip_ids]
+    else:
+        cursor = db["trips"].find({"status": "completed"}, {"_id": 1}).sort("startTime", -1).limit(limit)
+        ids = [t["_id"] for t in cursor]
+    out = []
+    for tid in ids:
+        df, found = load_bucketed(db[BUCKETS_COLLECTION], [tid])
+        if not found:
+            rows = list(db["samples"].find({"tripId": tid}, {"_id": 0}).sort("timestamp", 1))
+            if not rows:
+                continue
+            df = flatten_samples(pd.json_normalize(rows))
+        out.append(encode_records(df))
+    return out
+
+
+def _tokens(args) -> List[str]:
+    tokens = list(args.token or [])
+    if args.tokens_file:
+        with open(args.tokens_file, encoding="utf-8") as f:
+            tokens += [line.strip() for line in f if line.strip()]
+    if args.user_id:
+        secret = os.getenv("JWT_SECRET")
+        if not secret:
+            raise SystemExit("--user-id потребує JWT_SECRET у середовищі")
+        tokens += [mint_token(u, secret) for u in args.user_id]
+    if not tokens:
+        raise SystemExit("потрібен хоча б один --token, --tokens-file або --user-id")
+    return tokens
+
+
+def _require_websockets():
+    try:
+        import websockets  # pip install -r requirements-dev.txt
+    except Exception:
+        raise SystemExit("websockets не встановлено (pip install -r requirements-dev.txt)")
+    return websockets
+
+
+def main():
+    ap = argparse.ArgumentParser("Replay telemetry trips over the binary WebSocket protocol")
+    ap.add_argument("--url", default="ws://localhost:8000")
+    ap.add_argument("--token", action="append", help="JWT of a driver with an assigned vehicle (repeatable)")
+    ap.add_argument("--tokens-file", default=None, help="one JWT per line")
+    ap.add_argument("--user-id", action="append", help="mint a JWT with JWT_SECRET for this user (repeatable)")
+    ap.add_argument("--speedup", type=float, default=1.0, help="trip time / wall time; 0 = no pauses")
+    ap.add_argument("--frame-records", type=int, default=MAX_RECORDS_PER_FRAME)
+    ap.add_argument("--trips-per-vehicle", type=int, default=1)
+    ap.add_argument("--ramp-s", type=float, default=0.0)
+    ap.add_argument("--keep-timestamps", action="store_true", help="send original sample timestamps")
+    ap.add_argument("--source", choices=("synthetic", "mongo"), default="synthetic")
+    ap.add_argument("--samples", type=int, default=1200, help="samples per synthetic trip")
+    ap.add_argument("--trip-id", action="append", help="source trip for --source mongo (repeatable)")
+    ap.add_argument("--limit", type=int, default=10, help="latest completed trips for --source mongo")
+    ap.add_argument("--mongo", default=None, help="enables end-to-end timing via trips.predictionSummary")
+    ap.add_argument("--db", default="fleetms")
+    ap.add_argument("--e2e-timeout", type=float, default=300.0)
+    ap.add_argument("--out", default=None, help="append the JSON result to this file")
+    args = ap.parse_args()
+    _require_websockets()
+
+    tokens = _tokens(args)
+    db = None
+    if args.mongo:
+        from pymongo import MongoClient
+        db = MongoClient(args.mongo)[args.db]
+    if args.source == "mongo":
+        if db is None:
+            raise SystemExit("--source mongo потребує --mongo")
+        trips = mongo_records(db, args.trip_id or [], args.limit)
+    else:
+        trips = synthetic_records(len(tokens) * args.trips_per_vehicle, args.samples)
+    if not trips:
+        raise SystemExit("нема трипів для replay")
+
+    result = asyncio.run(run_replay(
+        args.url, tokens, trips, trips_per_vehicle=args.trips_per_vehicle, speedup=args.speedup,
+        ramp_s=args.ramp_s, per_frame=args.frame_records, keep_timestamps=args.keep_timestamps,
+        trips_col=db["trips"] if db is not None else None, e2e_timeout_s=args.e2e_timeout,
+    ))
+    line = json.dumps(result)
+    print(line)
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+if __name__ == "__main__":
+    main()
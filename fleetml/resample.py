@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Ресемплінг телеметрії на фіксовану часову сітку (спільний для trainer і predictor).
+
+Кожен трип агрегується по бінах тривалістю period_s (числові колонки — середнє,
+решта — перше значення в біні). Порожні біни всередині розриву <= gap_s
+заповнюються лінійною інтерполяцією, довші розриви лишаються розривами,
+щоб downstream-логіка по GAP_S (accel, gps speed) спрацьовувала як і раніше.
+
+bucket_average — усереднення у вікна SAMPLES_BUCKET_S (те саме, що pushdown-пайплайн
+trainer-а в Mongo); predictor застосовує його для моделей, натренованих на вікнах.
+"""
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def _interp_fill(values: np.ndarray, prev_idx: np.ndarray, frac: np.ndarray) -> np.ndarray:
+    a = values[prev_idx]
+    b = values[prev_idx + 1]
+    return a + (b - a) * frac[:, None]
+
+
+def resample_fixed_rate(df: pd.DataFrame,
+                        period_s: float = 1.0,
+                        gap_s: float = 6.0,
+                        time_col: str = "timestamp",
+                        group_col: str = "tripId") -> pd.DataFrame:
+    """
+    df: плоский фрейм семплів (колонки trainer-а або json_normalize у predictor-і).
+    Повертає новий фрейм з тими ж колонками, по одному рядку на бін,
+    відсортований за (group_col, time_col). Рядки без часу чи трипу відкидаються.
+    """
+    if df.empty or period_s <= 0:
+        return df
+
+    ts = pd.to_datetime(df[time_col], utc=True, errors="coerce")
+    ok = ts.notna().to_numpy()
+    if group_col in df.columns:
+        ok &= df[group_col].notna().to_numpy()
+    df = df.loc[ok]
+    period_ns = int(round(float(period_s) * 1e9))
+    bins = ts[ok].astype("int64").to_numpy() // period_ns
+
+    if group_col in df.columns:
+        gcodes, guniq = pd.factorize(df[group_col], sort=False)
+    else:
+        gcodes, guniq = np.zeros(len(df), dtype=np.int64), None
+
+    rest = [c for c in df.columns if c not in (time_col, group_col)]
+    num_cols: List[str] = [c for c in rest
+                           if pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])]
+    other_cols: List[str] = [c for c in rest if c not in num_cols]
+
+    work = df[num_cols + other_cols].copy()
+    work["_g"] = gcodes
+    work["_b"] = bins
+    grp = work.groupby(["_g", "_b"], sort=True)
+    agg_num = grp[num_cols].mean() if num_cols else None
+    agg_other = grp[other_cols].first() if other_cols else None
+    keys = (agg_num if agg_num is not None else agg_other).index
+    g = keys.get_level_values(0).to_numpy()
+    b = keys.get_level_values(1).to_numpy()
+
+    # розриви всередині трипу, які коротші за gap_s, добудовуємо інтерполяцією
+    step = np.diff(b)
+    same = g[1:] == g[:-1]
+    hole = np.where(same & (step > 1) & (step * float(period_s) <= float(gap_s)), step - 1, 0)
+    n_fill = int(hole.sum())
+
+    num_vals = agg_num.to_numpy(dtype=float) if agg_num is not None else np.empty((len(keys), 0))
+    other_vals = agg_other.to_numpy(dtype=object) if agg_other is not None else np.empty((len(keys), 0), dtype=object)
+
+    if n_fill:
+        prev_idx = np.repeat(np.arange(len(hole)), hole)
+        starts = np.repeat(np.cumsum(hole) - hole, hole)
+        k = np.arange(n_fill) - starts + 1
+        frac = k / (hole[prev_idx] + 1.0)
+        g = np.r_[g, g[prev_idx]]
+        b = np.r_[b, b[prev_idx] + k]
+        num_vals = np.vstack([num_vals, _interp_fill(num_vals, prev_idx, frac)])
+        other_vals = np.vstack([other_vals, other_vals[prev_idx]])
+        order = np.lexsort((b, g))
+        g, b = g[order], b[order]
+        num_vals, other_vals = num_vals[order], other_vals[order]
+
+    out = pd.DataFrame(num_vals, columns=num_cols)
+    for j, c in enumerate(other_cols):
+        out[c] = other_vals[:, j]
+    out[time_col] = pd.to_datetime(b * period_ns, utc=True)
+    if guniq is not None:
+        out[group_col] = np.asarray(guniq, dtype=object)[g]
+    return out[[c for c in df.columns if c in out.columns]]
+
+
+# плоскі поля семплів (fleetml.features.RAW_FIELDS), які усереднюються у вікна
+BUCKET_FIELDS = ["gps_latitude", "gps_longitude", "gps_altitude", "obd_speed", "obd_rpm",
+                 "obd_throttle", "coolantC", "intakeC", "fuelRate"]
+
+
+def bucket_average(df: pd.DataFrame, bucket_s: float, fields: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Плоский фрейм семплів -> рядки без timestamp / GPS / fuelRate відкидаються, а bucket_s > 0
+    додатково усереднює поля в межах трипу у вікна по bucket_s секунд від epoch
+    (timestamp — початок вікна). Дзеркало $match/$group пайплайна trainer-а.
+    """
+    fields = fields or BUCKET_FIELDS
+    df = df.dropna(subset=["timestamp", "gps_latitude", "gps_longitude", "fuelRate"])
+    if bucket_s <= 0 or df.empty:
+        return df.reset_index(drop=True)
+    ts = pd.to_datetime(df["timestamp"], utc=True)
+    key = ts.dt.floor(pd.Timedelta(seconds=bucket_s)).rename("timestamp")
+    return df.groupby([df["tripId"], key], sort=False)[fields].mean().reset_index()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Проріджені ряди прогнозованої / фактичної витрати для графіків трипу.
+
+Для кожного рівня деталізації (кількість точок) зберігаються індекси, вибрані
+LTTB (Largest-Triangle-Three-Buckets) або min/max-децимацією по прогнозу,
+і три упаковані масиви: t (int64 мс), pred і actual (float32, NaN — нема даних).
+Документ живе в колекції prediction_series, один на (tripId, version).
+"""
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+SERIES_COLLECTION = "prediction_series"
+SERIES_FORMAT = 1
+SERIES_LEVELS = (300, 1500, 6000)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Індекси точок LTTB; перша й остання точки завжди лишаються."""
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1][:max(n_out, 0)], dtype=np.int64)
+    y = np.nan_to_num(y.astype(float), nan=0.0)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # середня точка наступного бакета (для останнього — остання точка ряду)
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Мін і макс у кожному з n_out/2 бакетів (зберігає піки, дешевше за LTTB)."""
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    y = np.nan_to_num(y.astype(float), nan=0.0)
+    edges = np.linspace(0, n, max(1, n_out // 2) + 1).astype(int)
+    idx = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi > lo:
+            seg = y[lo:hi]
+            idx += [lo + int(np.argmin(seg)), lo + int(np.argmax(seg))]
+    return np.unique(idx)
+
+
+def build_series_levels(t_ms: np.ndarray, pred: np.ndarray, actual: np.ndarray,
+                        levels: Sequence[int] = SERIES_LEVELS, method: str = "lttb") -> List[Dict[str, Any]]:
+    """Рівні від найгрубшого; рівні, не менші за довжину ряду, зводяться до одного повного."""
+    from bson.binary import Binary
+
+    n = len(t_ms)
+    out: List[Dict[str, Any]] = []
+    for level in sorted(set(int(v) for v in levels)):
+        if level >= n:
+            idx = np.arange(n)
+        elif method == "minmax":
+            idx = minmax_indices(pred, level)
+        else:
+            idx = lttb_indices(t_ms.astype(float), pred, level)
+        out.append({
+            "points": int(len(idx)),
+            "t": Binary(t_ms[idx].astype("<i8").tobytes()),
+            "pred": Binary(pred[idx].astype("<f4").tobytes()),
+            "actual": Binary(actual[idx].astype("<f4").tobytes()),
+        })
+        if level >= n:
+            break
+    return out
+
+
+def decode_level(level: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    n = int(level["points"])
+    return {
+        "t": np.frombuffer(level["t"], dtype="<i8", count=n),
+        "pred": np.frombuffer(level["pred"], dtype="<f4", count=n),
+        "actual": np.frombuffer(level["actual"], dtype="<f4", count=n),
+    }
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Опційний шардинг за vehicleId між репліками predictor-а / trainer-а.
+
+Кожна репліка пише heartbeat у Mongo (колекція shard_members) і будує
+консистентне хеш-кільце з живих реплік групи. Повідомлення з загальної черги,
+яке належить іншій репліці, пересилається в її приватну чергу
+"{queue}.shard.{replicaId}" через default exchange — паблішери нічого не змінюють.
+Коли репліка зникає (heartbeat протух або вона вийшла штатно), кільце
+перебудовується, а її приватну чергу дренує "лідер" (перша жива репліка за id),
+пересилаючи повідомлення новим власникам.
+"""
+import bisect
+import datetime
+import hashlib
+import logging
+import os
+import socket
+import threading
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger("fleetml.sharding")
+
+HOPS_HEADER = "x-shard-hops"
+MAX_HOPS = 3
+
+
+def _h(key: str) -> int:
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """Консистентне хешування з віртуальними вузлами."""
+    def __init__(self, nodes: Iterable[str], vnodes: int = 64):
+        self.nodes = sorted(set(nodes))
+        points = sorted((_h(f"{n}#{i}"), n) for n in self.nodes for i in range(vnodes))
+        self._keys = [p for p, _ in points]
+        self._owners = [n for _, n in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, _h(key)) % len(self._keys)
+        return self._owners[i]
+
+
+def default_replica_id() -> str:
+    return os.getenv("SHARD_REPLICA_ID") or socket.gethostname()
+
+
+def shard_queue(base: str, replica_id: str) -> str:
+    return f"{base}.shard.{replica_id}"
+
+
+class ShardMembership:
+    """
+    Членство реплік групи (напр. "predictor") через heartbeat-и в Mongo.
+    Heartbeat іде з окремого потоку, тож довгі синхронні задачі (тренування)
+    не виключають репліку з кільця.
+    """
+    def __init__(self, collection, group: str, replica_id: Optional[str] = None,
+                 ttl_s: float = 30.0, heartbeat_s: float = 10.0, vnodes: int = 64):
+        self.col = collection
+        self.group = group
+        self.replica_id = replica_id or default_replica_id()
+        self.ttl_s = ttl_s
+        self.heartbeat_s = heartbeat_s
+        self.vnodes = vnodes
+        self.ring = HashRing([self.replica_id], vnodes)
+        self._orphans: List[str] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls, collection, group: str) -> "ShardMembership":
+        return cls(collection, group,
+                   ttl_s=float(os.getenv("SHARD_TTL_S", "30")),
+                   heartbeat_s=float(os.getenv("SHARD_HEARTBEAT_S", "10")))
+
+    def _doc_id(self, replica_id: str) -> str:
+        return f"{self.group}:{replica_id}"
+
+    def _beat(self):
+        now = datetime.datetime.utcnow()
+        self.col.update_one(
+            {"_id": self._doc_id(self.replica_id)},
+            {"$set": {"group": self.group, "replicaId": self.replica_id, "heartbeatAt": now, "leaving": False},
+             "$setOnInsert": {"startedAt": now}},
+            upsert=True,
+        )
+        self.refresh(now)
+
+    def refresh(self, now: Optional[datetime.datetime] = None):
+        now = now or datetime.datetime.utcnow()
+        cutoff = now - datetime.timedelta(seconds=self.ttl_s)
+        live, orphans = [], []
+        for d in self.col.find({"group": self.group}, {"replicaId": 1, "heartbeatAt": 1, "leaving": 1}):
+            if d.get("leaving") or d.get("heartbeatAt") is None or d["heartbeatAt"] < cutoff:
+                orphans.append(d["replicaId"])
+            else:
+                live.append(d["replicaId"])
+        if self.replica_id not in live:
+            live.append(self.replica_id)
+        if sorted(live) != self.ring.nodes:
+            logger.info(f"[shard] {self.group} rebalance: {self.ring.nodes} -> {sorted(live)}")
+            self.ring = HashRing(live, self.vnodes)
+        self._orphans = orphans
+
+    def _loop(self):
+        while not self._stop.wait(self.heartbeat_s):
+            try:
+                self._beat()
+            except Exception:
+                logger.exception("[shard] heartbeat failed")
+
+    def start(self):
+        self._beat()
+        self._thread = threading.Thread(target=self._loop, name=f"shard-{self.group}", daemon=True)
+        self._thread.start()
+        logger.info(f"[shard] {self.group}: replica '{self.replica_id}' joined, ring={self.ring.nodes}")
+
+    def stop(self):
+        """Штатний вихід: помічаємо себе як leaving — чергу дренує лідер."""
+        self._stop.set()
+        self.col.update_one({"_id": self._doc_id(self.replica_id)}, {"$set": {"leaving": True}})
+
+    def owner(self, vehicle_id: str) -> str:
+        return self.ring.owner(str(vehicle_id)) or self.replica_id
+
+    def is_mine(self, vehicle_id: str) -> bool:
+        return self.owner(vehicle_id) == self.replica_id
+
+    def is_leader(self) -> bool:
+        return self.ring.nodes[0] == self.replica_id
+
+    def orphans(self) -> List[str]:
+        """Репліки, чиї приватні черги треба дренувати (лише для лідера)."""
+        return list(self._orphans) if self.is_leader() else []
+
+    def forget(self, replica_id: str):
+        self.col.delete_one({"_id": self._doc_id(replica_id), "replicaId": {"$ne": self.replica_id}})
+
+
+def next_hops(headers: Optional[Dict]) -> int:
+    return int((headers or {}).get(HOPS_HEADER, 0)) + 1
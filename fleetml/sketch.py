@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Потокові скетчі ознак із пам'яттю O(1) на ознаку і drift між тренуванням і продом.
+
+Скетч: count, кількість NaN, mean/M2 (Welford/Chan — зливається батчами),
+min/max і гістограма на фіксованих межах. Межі — квантилі тренувальних даних
+(trainer знімає їх один раз), predictor оновлює скетч тими самими межами, тож
+гістограми порівнюються напряму: PSI по бінах + зсув середнього в SD тренування
++ зміна частки NaN. Квантилі оцінюються інтерполяцією по гістограмі.
+"""
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+SKETCH_BINS = 10
+PSI_EPS = 1e-4
+
+
+class FeatureSketch:
+    def __init__(self, edges: Iterable[float]):
+        self.edges = np.asarray(list(edges), dtype=float)
+        # бін 0 — нижче першої межі, останній — вище останньої
+        self.hist = np.zeros(len(self.edges) + 1, dtype=np.int64)
+        self.n = 0
+        self.nan = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    @classmethod
+    def fit(cls, x: np.ndarray, bins: int = SKETCH_BINS) -> "FeatureSketch":
+        """Межі — внутрішні квантилі x; одразу ж оновлюється цими даними."""
+        x = np.asarray(x, dtype=float)
+        finite = x[np.isfinite(x)]
+        edges = np.unique(np.quantile(finite, np.linspace(0.0, 1.0, bins + 1)[1:-1])) if len(finite) else []
+        sk = cls(edges)
+        sk.update(x)
+        return sk
+
+    def update(self, x: np.ndarray) -> "FeatureSketch":
+        x = np.asarray(x, dtype=float)
+        ok = np.isfinite(x)
+        self.nan += int((~ok).sum())
+        v = x[ok]
+        m = len(v)
+        if m == 0:
+            return self
+        b_mean = float(v.mean())
+        self._merge_moments(m, b_mean, float(((v - b_mean) ** 2).sum()), float(v.min()), float(v.max()))
+        self.hist += np.bincount(np.searchsorted(self.edges, v, side="right"), minlength=len(self.hist))
+        return self
+
+    def merge(self, other: "FeatureSketch") -> "FeatureSketch":
+        """Додати скетч з тими самими межами (напр. накопичений іншою реплікою)."""
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("sketch edges differ")
+        self.nan += other.nan
+        self.hist += other.hist
+        if other.n:
+            self._merge_moments(other.n, other.mean, other.m2, other.min, other.max)
+        return self
+
+    def _merge_moments(self, m: int, b_mean: float, b_m2: float, b_min: float, b_max: float):
+        # злиття моментів батча (Chan et al.)
+        n = self.n + m
+        delta = b_mean - self.mean
+        self.mean += delta * m / n
+        self.m2 += b_m2 + delta * delta * self.n * m / n
+        self.n = n
+        self.min = min(self.min, b_min)
+        self.max = max(self.max, b_max)
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else 0.0
+
+    @property
+    def nan_share(self) -> float:
+        total = self.n + self.nan
+        return self.nan / total if total else 0.0
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.n == 0:
+            return None
+        bounds = np.r_[self.min, np.clip(self.edges, self.min, self.max), self.max]
+        cum = np.cumsum(self.hist)
+        target = q * self.n
+        i = int(np.searchsorted(cum, target, side="left"))
+        i = min(i, len(self.hist) - 1)
+        below = cum[i - 1] if i > 0 else 0
+        frac = (target - below) / self.hist[i] if self.hist[i] else 0.0
+        return float(bounds[i] + frac * (bounds[i + 1] - bounds[i]))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "edges": [float(e) for e in self.edges],
+            "hist": [int(h) for h in self.hist],
+            "n": self.n, "nan": self.nan,
+            "mean": self.mean, "m2": self.m2,
+            "min": self.min if self.n else None, "max": self.max if self.n else None,
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "FeatureSketch":
+        sk = cls(d["edges"])
+        sk.hist = np.asarray(d["hist"], dtype=np.int64)
+        sk.n, sk.nan = int(d["n"]), int(d["nan"])
+        sk.mean, sk.m2 = float(d["mean"]), float(d["m2"])
+        sk.min = d["min"] if d.get("min") is not None else np.inf
+        sk.max = d["max"] if d.get("max") is not None else -np.inf
+        return sk
+
+    def empty_like(self) -> "FeatureSketch":
+        return FeatureSketch(self.edges)
+
+
+def fit_sketches(X: pd.DataFrame, columns: List[str], bins: int = SKETCH_BINS) -> Dict[str, FeatureSketch]:
+    return {c: FeatureSketch.fit(X[c].to_numpy(dtype=float), bins) for c in columns}
+
+
+def sketches_to_dict(sketches: Dict[str, FeatureSketch]) -> Dict[str, Dict[str, Any]]:
+    return {c: sk.to_dict() for c, sk in sketches.items()}
+
+
+def sketches_from_dict(d: Dict[str, Dict[str, Any]]) -> Dict[str, FeatureSketch]:
+    return {c: FeatureSketch.from_dict(v) for c, v in d.items()}
+
+
+def psi(ref: FeatureSketch, cur: FeatureSketch) -> Optional[float]:
+    """Population Stability Index по спільних бінах (межі мають збігатися)."""
+    if ref.n == 0 or cur.n == 0 or len(ref.hist) != len(cur.hist):
+        return None
+    p = np.maximum(ref.hist / ref.n, PSI_EPS)
+    q = np.maximum(cur.hist / cur.n, PSI_EPS)
+    return float(((q - p) * np.log(q / p)).sum())
+
+
+def drift_scores(ref: Dict[str, FeatureSketch], cur: Dict[str, FeatureSketch]) -> Dict[str, Any]:
+    """{"features": {col: {psi, meanShiftSd, nanShareDelta}}, "maxPsi": ...}."""
+    out: Dict[str, Dict[str, Optional[float]]] = {}
+    for c, r in ref.items():
+        s = cur.get(c)
+        if s is None:
+            continue
+        shift = (s.mean - r.mean) / r.std if s.n and r.std > 0 else None
+        p = psi(r, s)
+        out[c] = {
+            "psi": round(p, 4) if p is not None else None,
+            "meanShiftSd": round(shift, 3) if shift is not None else None,
+            "nanShareDelta": round(s.nan_share - r.nan_share, 4),
+        }
+    psis = [v["psi"] for v in out.values() if v["psi"] is not None]
+    return {"features": out, "maxPsi": max(psis) if psis else None}
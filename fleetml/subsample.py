@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Стратифікований сабсемплінг тренувальної вибірки з ваговими коефіцієнтами (model-trainer).
+
+Ваги відновлюють розподіл повної вибірки. Кроки пайплайна, що приймають sample_weight,
+отримують їх напряму; для MLPRegressor без sample_weight (sklearn < 1.7) рядки
+перевибираються пропорційно вазі (resample_by_weight) — інакше рідкісні страти були б
+переоцінені без жодної корекції.
+"""
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def stratified_subsample(df_feat: pd.DataFrame,
+                         max_per_stratum: int = 200,
+                         speed_bin_kmh: float = 10.0,
+                         throttle_bin: float = 10.0,
+                         rpm_bin: float = 500.0,
+                         random_state: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Стратифікований сабсемплінг: страта = (tripId, бін швидкості, бін педалі, бін обертів).
+    У кожній страті лишаємо не більше max_per_stratum випадкових рядків,
+    вага рядка = розмір страти / кількість залишених (сума ваг = кількість рядків до сабсемплінгу).
+    Повертає (позиційні індекси залишених рядків у df_feat, ваги).
+    """
+    n = len(df_feat)
+    if n == 0 or max_per_stratum <= 0:
+        return np.arange(n), np.ones(n, dtype=float)
+
+    def bin_of(col: str, step: float) -> np.ndarray:
+        v = pd.to_numeric(df_feat[col], errors="coerce").to_numpy(dtype=float)
+        b = np.floor(v / float(step))
+        return np.where(np.isfinite(b), b, -1).astype(np.int64)
+
+    keys = pd.DataFrame({
+        "trip": pd.factorize(df_feat["tripId"].to_numpy())[0],
+        "sb": bin_of("speedKmh", speed_bin_kmh),
+        "tb": bin_of("obd_throttle", throttle_bin),
+        "rb": bin_of("obd_rpm", rpm_bin),
+    })
+    # випадковий порядок всередині страти → cumcount бере перші max_per_stratum
+    rng = np.random.default_rng(random_state)
+    perm = rng.permutation(n)
+    shuffled = keys.iloc[perm]
+    grp = shuffled.groupby(["trip", "sb", "tb", "rb"], sort=False)
+    rank = grp.cumcount().to_numpy()
+    size = grp["trip"].transform("size").to_numpy()
+
+    keep = rank < max_per_stratum
+    idx = perm[keep]
+    w = size[keep] / np.minimum(size[keep], max_per_stratum)
+    order = np.argsort(idx, kind="stable")
+    return idx[order], w[order].astype(float)
+
+
+def resample_by_weight(weight: np.ndarray, size: int = 0, random_state: int = 42) -> np.ndarray:
+    """
+    Індекси рядків, де рядок i зустрічається ~ weight[i] / sum(weight) * size разів
+    (систематичний ресемплінг: один випадковий зсув, дисперсія мінімальна).
+    size=0 — стільки ж рядків, скільки ваг.
+    """
+    w = np.asarray(weight, dtype=float)
+    n = len(w)
+    size = size or n
+    if n == 0 or size <= 0:
+        return np.zeros(0, dtype=np.int64)
+    cum = np.cumsum(w) / w.sum() * size
+    pos = np.arange(size) + np.random.default_rng(random_state).random()
+    return np.minimum(np.searchsorted(cum, pos, side="right"), n - 1).astype(np.int64)
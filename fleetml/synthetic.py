@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Синтетичні трипи у форматі колекції samples (для тестів, бенчмарків і replay).
+
+Профіль: рушання з місця, круїз із синусоїдою швидкості, холостий хід наприкінці.
+Частота OBD — нерівномірна (з дублікатами timestamp), GPS оновлюється рідше,
+тож у координатах є "плато", як у реальних телефонах.
+"""
+import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def synthetic_trip(n: int = 1200,
+                   trip_id: Any = "trip-0",
+                   seed: int = 0,
+                   start: Optional[datetime.datetime] = None,
+                   period_s: float = 0.5,
+                   dup_share: float = 0.05,
+                   gps_period_s: float = 1.0,
+                   idle_share: float = 0.15) -> List[Dict[str, Any]]:
+    """Список документів {tripId, timestamp, gps{...}, obd{...}} відсортований за часом."""
+    rng = np.random.default_rng(seed)
+    start = start or datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+    dts = rng.uniform(0.5, 1.5, size=n) * period_s
+    dts[rng.random(n) < dup_share] = 0.0
+    dts[0] = 0.0
+    t = np.round(np.cumsum(dts), 3)  # Mongo зберігає мілісекунди
+
+    k = np.arange(n)
+    v = 55.0 + 35.0 * np.sin(k / 80.0) + rng.normal(0.0, 2.0, n)
+    ramp = max(1, n // 20)
+    v[:ramp] *= np.linspace(0.0, 1.0, ramp)
+    v[n - int(n * idle_share):] = 0.0
+    v = np.clip(v, 0.0, None)
+
+    dist_m = np.cumsum(v / 3.6 * dts)
+    heading = np.radians(30.0 + 20.0 * np.sin(k / 300.0))
+    lat = 50.45 + np.cumsum(np.r_[0.0, np.diff(dist_m)] * np.cos(heading)) / 111_320.0
+    lon = 30.52 + np.cumsum(np.r_[0.0, np.diff(dist_m)] * np.sin(heading)) / (111_320.0 * np.cos(np.radians(50.45)))
+    alt = 150.0 + 8.0 * np.sin(dist_m / 700.0)
+
+    # GPS тримає останній фікс до наступного оновлення
+    fix = np.floor(t / gps_period_s)
+    hold = np.r_[0, np.flatnonzero(np.diff(fix) > 0) + 1]
+    src = hold[np.searchsorted(hold, k, side="right") - 1]
+    lat, lon, alt = lat[src], lon[src], alt[src]
+
+    rpm = np.where(v > 0, 900.0 + v * 28.0, 780.0) + rng.normal(0.0, 25.0, n)
+    throttle = np.clip(v / 2.2 + rng.normal(0.0, 3.0, n), 0.0, 100.0)
+    fuel = np.clip(0.25 + 0.012 * v + 0.004 * throttle + rng.normal(0.0, 0.03, n), 0.0, None)
+    coolant = np.clip(40.0 + t / 6.0, None, 90.0)
+
+    ts = pd.to_datetime(start) + pd.to_timedelta(t, unit="s")
+    return [
+        {
+            "tripId": trip_id,
+            "timestamp": ts[i].to_pydatetime(),
+            "gps": {"latitude": float(lat[i]), "longitude": float(lon[i]), "altitude": float(alt[i])},
+            "obd": {
+                "vehicleSpeed": float(round(v[i])),
+                "engineRpm": float(round(rpm[i])),
+                "acceleratorPosition": float(throttle[i]),
+                "engineCoolantTemp": float(round(coolant[i])),
+                "intakeAirTemp": 22.0,
+                "fuelConsumptionRate": float(fuel[i]),
+            },
+        }
+        for i in range(n)
+    ]
+
+
+def synthetic_fleet(n_trips: int = 4, n: int = 1200, seed: int = 0) -> pd.DataFrame:
+    """Кілька трипів одним json_normalize-фреймом (як після find() у predictor-і)."""
+    docs: List[Dict[str, Any]] = []
+    for i in range(n_trips):
+        start = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(hours=i)
+        docs += synthetic_trip(n, trip_id=f"trip-{i}", seed=seed + i, start=start)
+    return pd.json_normalize(docs)
@@ -39,6 +39,16 @@ export interface Trip {
     MAE: number;
     RMSE: number;
     R2: number;
+    distanceKm?: number;
+    idleDurationSec?: number;
+    motionDurationSec?: number;
+    fuelUsedInIdleL?: number;
+    fuelUsedInMotionL?: number;
+    distanceBucketKm?: number;
+    fuelPerDistance?: {
+      fromKm: number;
+      fuelUsedL: number;
+    }[];
   };
   numSamples?: number;
   role?: string;
@@ -5,6 +5,8 @@ import os
 import json
 import math
 import time
+import hashlib
+import warnings
 import traceback
 from datetime import datetime
 from typing import List, Dict, Tuple, Optional
@@ -21,12 +23,28 @@ from pymongo import MongoClient
 from pymongo.collection import Collection
 from bson.objectid import ObjectId
 
+from fleetml.buckets import BUCKETS_COLLECTION, load_bucketed
+from fleetml.checkpoint import TrainCheckpoint
+from fleetml.features import FEATURE_VERSION, FeatureParams, build_training_features
+from fleetml.resample import BUCKET_FIELDS, bucket_average, resample_fixed_rate
+from fleetml.sketch import fit_sketches, sketches_to_dict
+from fleetml.subsample import resample_by_weight, stratified_subsample
+from fleetml.sharding import HOPS_HEADER, MAX_HOPS, ShardMembership, next_hops, shard_queue
+
 
 # ================ ENV ================
 MONGO_URI = os.getenv("MONGODB_URI", "mongodb://mongo:27017/fleetms")
 MONGO_DB  = os.getenv("MONGODB_DB", "fleetms")
 QUEUE_IN  = os.getenv("TRAIN_QUEUE", "model-train")
 MODELS_ROOT = os.getenv("MODELS_ROOT", "/models")  # volume
+# Чекпойнти етапів джоба в {out_dir}/checkpoint (повторно доставлений джоб продовжує з останнього)
+CHECKPOINT = os.getenv("TRAIN_CHECKPOINT", "1") == "1"
+# Порції епох MLP з чекпойнтом моделі (opt-in): кожна порція — новий Adam і відновлення
+# найкращих ваг early stopping, тож траєкторія відрізняється від звичайного fit.
+# 0 — модель тренується одним fit, як без чекпойнтів (зберігаються лише семпли/ознаки).
+CHECKPOINT_EPOCHS = int(os.getenv("TRAIN_CHECKPOINT_EPOCHS", "0"))
+# Базові моделі флоту: MODELS_ROOT/_fleet/{version} (predictor їх не індексує)
+FLEET_DIR = "_fleet"
 
 # ================ Mongo ================
 mongo_client: Optional[MongoClient] = None
@@ -34,10 +52,14 @@ db = None
 Models: Collection = None
 Trips: Collection = None
 Samples: Collection = None
+SampleBuckets: Collection = None
+
+# Опційний шардинг за vehicleId між репліками (SHARDING=1)
+SHARDING: Optional[ShardMembership] = None
 
 
 def mongo_connect():
-    global mongo_client, db, Models, Trips, Samples
+    global mongo_client, db, Models, Trips, Samples, SampleBuckets
     mongo_client = MongoClient(MONGO_URI)
     # Якщо в URI нема /db, дозволимо перевизначити через MONGO_DB
     if "/" in MONGO_URI.split("://", 1)[-1] and MONGO_URI.split("/")[-1]:
@@ -48,6 +70,7 @@ def mongo_connect():
     Models  = db["models"]
     Trips   = db["trips"]
     Samples = db["samples"]
+    SampleBuckets = db[BUCKETS_COLLECTION]
 
 
 # ================ RabbitMQ ================
@@ -78,247 +101,49 @@ def save_text(path: str, text: str):
         f.write(text)
 
 
-def haversine_km(lat1, lon1, lat2, lon2):
-    R = 6371.0
-    phi1 = np.radians(lat1); phi2 = np.radians(lat2)
-    dphi = np.radians(lat2 - lat1); dlambda = np.radians(lon2 - lon1)
-    a = np.sin(dphi/2.0)**2 + np.cos(phi1)*np.cos(phi2)*np.sin(dlambda/2.0)**2
-    c = 2*np.arctan2(np.sqrt(a), np.sqrt(1 - a))
-    return R * c
-
-
-def robust_rolling(series: pd.Series, window: int = 5) -> pd.Series:
-    med = series.rolling(window=window, center=True, min_periods=max(1, window // 2)).median()
-    sm = med.rolling(window=window, center=True, min_periods=max(1, window // 2)).mean()
-    return sm
-
-
-def compute_gps_speed(df: pd.DataFrame,
-                      gap_s: float = 6.0,
-                      same_eps_m: float = 2.0,
-                      max_span_s: float = 15.0,
-                      min_span_s: float = 1.5) -> pd.Series:
-    """
-    Якщо координати не змінюються кілька семплів — чекаємо першого з новими координатами
-    і розкидаємо середню швидкість на весь “плоский” відрізок; fallback — диференційний розрахунок.
-    """
-    out = np.full(len(df), np.nan, dtype=float)
-    for _, g in df.sort_values(["tripId", "timestamp"]).groupby("tripId", sort=False):
-        idx = g.index.to_numpy()
-        lat = g["gps_latitude"].astype(float).to_numpy()
-        lon = g["gps_longitude"].astype(float).to_numpy()
-        ts  = pd.to_datetime(g["timestamp"], utc=True, errors="coerce").astype("int64").to_numpy() / 1e9
-        if len(idx) == 0:
-            continue
-        anchor = 0
-        while anchor < len(idx) - 1:
-            j = anchor + 1
-            while j < len(idx):
-                dist_m = haversine_km(lat[anchor], lon[anchor], lat[j], lon[j]) * 1000.0
-                if np.isfinite(dist_m) and dist_m > same_eps_m:
-                    break
-                j += 1
-            if j < len(idx):
-                dt = ts[j] - ts[anchor]
-                if (dt > min_span_s) and (dt <= max_span_s):
-                    dist_km = haversine_km(lat[anchor], lon[anchor], lat[j], lon[j])
-                    out[idx[anchor+1:j+1]] = (dist_km / dt) * 3600.0
-                anchor = j
-            else:
-                break
-
-        prev_ts  = np.r_[np.nan, ts[:-1]]
-        prev_lat = np.r_[np.nan, lat[:-1]]
-        prev_lon = np.r_[np.nan, lon[:-1]]
-        dt1 = ts - prev_ts
-        dist1_km = haversine_km(prev_lat, prev_lon, lat, lon)
-        with np.errstate(divide="ignore", invalid="ignore"):
-            v1 = (dist1_km / dt1) * 3600.0
-        bad = (dt1 <= 0) | (dt1 > gap_s)
-        v1[bad] = np.nan
-        fill = np.isnan(out[idx]) & np.isfinite(v1)
-        out[idx[fill]] = v1[fill]
-    return pd.Series(out, index=df.index, name="gpsSpeedKmh")
-
-
-def complementary_fuse(v_obd: pd.Series, v_gps: pd.Series,
-                       base_alpha: float = 0.6,
-                       mismatch_thr_kmh: float = 15.0) -> pd.Series:
-    alpha = np.full(len(v_obd), float(base_alpha), dtype=float)
-    alpha = np.where(v_gps.isna(), 0.85, alpha)
-    mismatch = (np.abs(v_obd - v_gps) > mismatch_thr_kmh)
-    alpha = np.where(mismatch, np.maximum(alpha, 0.75), alpha)
-    fused = alpha * v_obd + (1.0 - alpha) * v_gps
-    fused = np.where(np.isnan(fused) & ~v_obd.isna(), v_obd, fused)
-    fused = np.where(np.isnan(fused) & ~v_gps.isna(), v_gps, fused)
-    return pd.Series(fused, index=v_obd.index, name="speedKmh")
-
-
-def build_features(df: pd.DataFrame,
-                   min_speed_kmh: float = 0.0,
-                   gap_s: float = 6.0,
-                   alpha: float = 0.6,
-                   break_s: float = 120.0,
-                   drop_idle: bool = False,
-                   idle_speed_kmh: float = 0.05,
-                   idle_fuel_mls: float = 0.005,
-                   mismatch_kmh: float = 15.0,
-                   a_accel_max_ms2: float = 6.0,
-                   a_decel_max_ms2: float = 6.0,
-                   phys_margin_kmh: float = 5.0,
-                   gps_same_eps_m: float = 2.0,
-                   gps_min_span_s: float = 1.5,
-                   gps_max_span_s: float = 15.0,
-                   vmax_kmh: float = 160.0) -> Tuple[pd.DataFrame, List[str]]:
+# ================ Aggregation (No path collisions) ================
+def load_samples_for_trips(trip_ids: List[ObjectId]) -> pd.DataFrame:
     """
-    df приходить уже з плоскими полями:
-    gps_latitude, gps_longitude, gps_altitude,
-    obd_speed, obd_rpm, obd_throttle, coolantC, intakeC,
-    fuelRate, tripId, timestamp
+    Витягаємо семпли по списку tripId через агрегування з плоским $project.
+    Це уникає path collision (наприклад, obd vs obd.fuelConsumptionRate).
+    Трипи, що вже скомпактовані в sample_buckets, читаються з бакетів.
     """
-    df = df.copy()
-    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
-    df = df.dropna(subset=["timestamp", "tripId", "gps_latitude", "gps_longitude"])
-
-    # GPS speed + згладження
-    df["gpsSpeedKmh_raw"] = compute_gps_speed(
-        df,
-        gap_s=gap_s,
-        same_eps_m=gps_same_eps_m,
-        max_span_s=gps_max_span_s,
-        min_span_s=gps_min_span_s
-    )
-    df["gpsSpeedKmh_smooth"] = (
-        df.groupby("tripId", sort=False)[["gpsSpeedKmh_raw"]]
-        .apply(lambda s: robust_rolling(s["gpsSpeedKmh_raw"], window=5))
-        .reset_index(level=0, drop=True)
-    )
-    df["gpsSpeedKmh_raw"] = df["gpsSpeedKmh_raw"].clip(upper=vmax_kmh)
-    df["gpsSpeedKmh_smooth"] = df["gpsSpeedKmh_smooth"].clip(upper=vmax_kmh)
-
-    # Фізика: перевіряємо GPS за границями прискорення
-    dt = df.groupby("tripId", sort=False)[["timestamp"]] \
-        .apply(lambda s: s["timestamp"].diff().dt.total_seconds()) \
-        .reset_index(level=0, drop=True)
-
-    v_obd_prev = df.groupby("tripId", sort=False)[["obd_speed"]] \
-        .apply(lambda s: s["obd_speed"].shift(1)).reset_index(level=0, drop=True)
-    v_gps_prev = df.groupby("tripId", sort=False)[["gpsSpeedKmh_smooth"]] \
-        .apply(lambda s: s["gpsSpeedKmh_smooth"].shift(1)).reset_index(level=0, drop=True)
-
-    v_prev_ref = v_obd_prev.fillna(v_gps_prev)
-
-    def bounds(prev_v_kmh, dt_s):
-        dvp = np.maximum(0.0, dt_s) * float(a_accel_max_ms2) * 3.6
-        dvm = np.maximum(0.0, dt_s) * float(a_decel_max_ms2) * 3.6
-        lower = np.maximum(0.0, prev_v_kmh - dvm) - float(phys_margin_kmh)
-        upper = (prev_v_kmh + dvp) + float(phys_margin_kmh)
-        return lower, upper
-
-    gps_low, gps_up = bounds(v_prev_ref, dt)
-    gps_ok = (
-            df["gpsSpeedKmh_smooth"].isna() |
-            v_prev_ref.isna() |
-            dt.isna() |
-            ((df["gpsSpeedKmh_smooth"] >= gps_low) & (df["gpsSpeedKmh_smooth"] <= gps_up))
-    )
-    gps_phys_mask = ~gps_ok
-    df.loc[gps_phys_mask, "gpsSpeedKmh_smooth"] = np.nan
-
-    # Ф’юзинг швидкостей, OBD ми не відкидаємо
-    df["obd_speed"] = pd.to_numeric(df["obd_speed"], errors="coerce")
-    df["gpsSpeedKmh_smooth"] = pd.to_numeric(df["gpsSpeedKmh_smooth"], errors="coerce")
-    df["speedKmh"] = complementary_fuse(df["obd_speed"], df["gpsSpeedKmh_smooth"],
-                                        base_alpha=alpha, mismatch_thr_kmh=mismatch_kmh)
-    df["speedKmh"] = df["speedKmh"].clip(upper=vmax_kmh)
-
-    # Таргет
-    df["y"] = pd.to_numeric(df["fuelRate"], errors="coerce")
-    df = df.dropna(subset=["y"])
-
-    # Прибрати "вимкнений" стан
-    if drop_idle:
-        sp = df["speedKmh"].fillna(0).abs() <= float(idle_speed_kmh)
-        fu = df["y"].fillna(0).abs() <= float(idle_fuel_mls)
-        df = df[~(sp & fu)].copy()
-
-    # Прискорення
-    def compute_accel(group: pd.DataFrame) -> pd.Series:
-        v_ms = (group["speedKmh"] / 3.6).to_numpy()
-        t = pd.to_datetime(group["timestamp"], utc=True, errors="coerce").astype("int64").to_numpy() / 1e9
-        dt_local = np.diff(t)
-        dv1 = np.diff(v_ms)
-        with np.errstate(divide="ignore", invalid="ignore"):
-            a = dv1 / dt_local
-        out = np.r_[np.nan, a]
-        out = np.where(np.r_[True, dt_local > gap_s], np.nan, out)
-        return pd.Series(out, index=group.index, name="accel_ms2")
-
-    df["accel_ms2"] = (
-        df.groupby("tripId", sort=False)[["timestamp", "speedKmh"]]
-        .apply(compute_accel).reset_index(level=0, drop=True)
-    )
+    if not trip_ids:
+        return pd.DataFrame()
 
-    # Ролінг-ознаки
-    for col in ["speedKmh", "accel_ms2", "obd_rpm", "obd_throttle"]:
-        df[f"{col}_mean5"] = (
-            df.groupby("tripId", sort=False)[[col]]
-            .apply(lambda s: s[col].rolling(5, min_periods=1).mean())
-            .reset_index(level=0, drop=True)
-        )
-        df[f"{col}_std5"] = (
-            df.groupby("tripId", sort=False)[[col]]
-            .apply(lambda s: s[col].rolling(5, min_periods=1).std())
-            .reset_index(level=0, drop=True)
-        )
+    df_buckets, bucketed = load_bucketed(SampleBuckets, trip_ids)
+    raw_ids = [tid for tid in trip_ids if tid not in bucketed]
+    if bucketed:
+        print(f"[info] {len(bucketed)}/{len(trip_ids)} trips read from buckets ({len(df_buckets)} samples)")
 
-    # Уклон (grade)
-    def compute_grade(group: pd.DataFrame) -> pd.Series:
-        lat = group["gps_latitude"].to_numpy()
-        lon = group["gps_longitude"].to_numpy()
-        alt = pd.to_numeric(group["gps_altitude"], errors="coerce").to_numpy()
-        lat_prev = np.r_[np.nan, lat[:-1]]
-        lon_prev = np.r_[np.nan, lon[:-1]]
-        alt_prev = np.r_[np.nan, alt[:-1]]
-        dist_km = haversine_km(lat_prev, lon_prev, lat, lon)
-        dist_m = dist_km * 1000.0
-        dh = alt - alt_prev
-        grade = np.full_like(dist_m, np.nan, dtype=float)
-        valid = np.isfinite(dist_m) & (dist_m > 1e-3) & np.isfinite(dh)
-        grade[valid] = dh[valid] / dist_m[valid]
-        ser = pd.Series(grade, index=group.index)
-        return ser.rolling(window=5, min_periods=1).median()
-
-    df["grade"] = (
-        df.groupby("tripId", sort=False)[["gps_latitude", "gps_longitude", "gps_altitude"]]
-        .apply(compute_grade).reset_index(level=0, drop=True)
-    )
+    pushdown = os.getenv("SAMPLES_PUSHDOWN", "0") == "1"
+    bucket_s = float(os.getenv("SAMPLES_BUCKET_S", "0")) if pushdown else 0.0
+    if pushdown and not df_buckets.empty:
+        df_buckets = bucket_average(df_buckets, bucket_s)
 
-    # Мінімальна швидкість (лишити таргет або швидкість вище порогу)
-    if min_speed_kmh > 0:
-        df = df[(df["speedKmh"].fillna(0) >= float(min_speed_kmh)) | (df["y"].notna())]
+    df_raw = _aggregate_raw_samples(raw_ids, pushdown=pushdown, bucket_s=bucket_s)
+    parts = [d for d in (df_buckets, df_raw) if not d.empty]
+    if not parts:
+        return pd.DataFrame()
+    df = pd.concat(parts, ignore_index=True)
+    # привести типи
+    if "timestamp" in df.columns:
+        df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
+    if "tripId" in df.columns:
+        # tripId уже ObjectId → зробимо str для групувань у sklearn
+        df["tripId"] = df["tripId"].astype(str)
+    return df
 
-    feature_cols = [
-        "speedKmh", "accel_ms2", "obd_rpm", "obd_throttle", "coolantC", "intakeC",
-        "speedKmh_mean5", "speedKmh_std5", "accel_ms2_mean5", "accel_ms2_std5",
-        "obd_rpm_mean5", "obd_rpm_std5", "obd_throttle_mean5", "obd_throttle_std5", "grade"
-    ]
-    for c in feature_cols + ["y"]:
-        df[c] = pd.to_numeric(df[c], errors="coerce")
-    df = df.dropna(subset=["y"])
-    df = df.dropna(subset=feature_cols, how="all")
-    for c in feature_cols:
-        df[c] = df[c].fillna(df[c].median())
 
-    out_cols = ["tripId", "timestamp"] + feature_cols + ["y"]
-    return df[out_cols].copy(), feature_cols
+_EPOCH = datetime(1970, 1, 1)
 
 
-# ================ Aggregation (No path collisions) ================
-def load_samples_for_trips(trip_ids: List[ObjectId]) -> pd.DataFrame:
+def _aggregate_raw_samples(trip_ids: List[ObjectId], pushdown: bool = False, bucket_s: float = 0.0) -> pd.DataFrame:
     """
-    Витягаємо семпли по списку tripId через агрегування з плоским $project.
-    Це уникає path collision (наприклад, obd vs obd.fuelConsumptionRate).
+    pushdown=True: рядки без timestamp / GPS / fuelRate відкидаються ще в Mongo
+    (їх однаково викине build_training_features), а bucket_s > 0 додатково
+    усереднює семпли у вікна по bucket_s секунд через $group — до Python
+    доходить лише по одному рядку на вікно.
     """
     if not trip_ids:
         return pd.DataFrame()
@@ -346,42 +171,46 @@ def load_samples_for_trips(trip_ids: List[ObjectId]) -> pd.DataFrame:
             "fuelRate": {"$ifNull": ["$obd.fuelConsumptionRate", "$fuelConsumptionRate"]},
         }}
     ]
+    if pushdown:
+        pipeline.append({"$match": {
+            "timestamp": {"$type": "date"},
+            "gps_latitude": {"$type": "number"},
+            "gps_longitude": {"$type": "number"},
+            "fuelRate": {"$type": "number"},
+        }})
+    if pushdown and bucket_s > 0:
+        ms = int(round(bucket_s * 1000))
+        t_ms = {"$subtract": ["$timestamp", _EPOCH]}  # date - date = мс
+        pipeline += [
+            {"$group": {
+                "_id": {"tripId": "$tripId", "t": {"$subtract": [t_ms, {"$mod": [t_ms, ms]}]}},
+                **{f: {"$avg": f"${f}"} for f in BUCKET_FIELDS},
+            }},
+            {"$project": {
+                "_id": 0,
+                "tripId": "$_id.tripId",
+                "timestamp": "$_id.t",  # мс від epoch, перетворюємо нижче
+                **{f: 1 for f in BUCKET_FIELDS},
+            }},
+        ]
+    t0 = time.time()
     rows = list(Samples.aggregate(pipeline, allowDiskUse=True))
-    if not rows:
-        return pd.DataFrame()
-    df = pd.DataFrame(rows)
-    # привести типи
-    if "timestamp" in df.columns:
-        df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
-    if "tripId" in df.columns:
-        # tripId уже ObjectId → зробимо str для групувань у sklearn
-        df["tripId"] = df["tripId"].astype(str)
+    if pushdown:
+        print(f"[info] pushdown: {len(rows)} rows from {len(trip_ids)} trips "
+              f"(bucket={bucket_s:g}s) in {time.time() - t0:.2f}s")
+    df = pd.DataFrame(rows) if rows else pd.DataFrame()
+    if pushdown and bucket_s > 0 and not df.empty:
+        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms", utc=True)
     return df
 
 
 # ================ Training ================
-def train_and_evaluate(df_feat: pd.DataFrame, feature_cols: List[str], out_dir: str) -> Dict[str, float]:
-    from sklearn.model_selection import GroupShuffleSplit
+def make_model():
     from sklearn.neural_network import MLPRegressor
     from sklearn.preprocessing import StandardScaler
     from sklearn.pipeline import Pipeline
-    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
     from sklearn.compose import TransformedTargetRegressor
 
-    ensure_dir(out_dir)
-    plots_dir = os.path.join(out_dir, "plots")
-    ensure_dir(plots_dir)
-
-    groups = df_feat["tripId"].values
-    X = df_feat[feature_cols].values
-    y = df_feat["y"].values
-
-    gss = GroupShuffleSplit(n_splits=1, train_size=0.8, random_state=42)
-    train_idx, test_idx = next(gss.split(X, y, groups=groups))
-
-    X_train, X_test = X[train_idx], X[test_idx]
-    y_train, y_test = y[train_idx], y[test_idx]
-
     base_reg = Pipeline([
         ("scaler", StandardScaler()),
         ("mlp", MLPRegressor(
@@ -398,20 +227,211 @@ def train_and_evaluate(df_feat: pd.DataFrame, feature_cols: List[str], out_dir:
         ))
     ])
 
-    model = TransformedTargetRegressor(regressor=base_reg, func=np.log1p, inverse_func=np.expm1)
-    model.fit(X_train, y_train)
+    return TransformedTargetRegressor(regressor=base_reg, func=np.log1p, inverse_func=np.expm1)
+
+
+def weighted_fit_params(sample_weight: Optional[np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Ваги прокидаємо в ті кроки пайплайна, які їх підтримують
+    (StandardScaler — завжди, MLPRegressor — лише в новіших sklearn).
+    Якщо MLP ваг не приймає, fit_and_score замість цього перевибирає рядки (resample_by_weight).
+    """
+    if sample_weight is None:
+        return {}
+    from sklearn.utils.validation import has_fit_parameter
+    reg = make_model().regressor
+    return {
+        f"{name}__sample_weight": sample_weight
+        for name, step in reg.steps
+        if has_fit_parameter(step, "sample_weight")
+    }
+
+
+def reset_training_state(mlp):
+    """Епохи й early stopping базової моделі не стосуються даних авто: ваги лишаються, лічильники — з нуля."""
+    mlp.loss_curve_ = []
+    mlp._no_improvement_count = 0
+    if mlp.early_stopping:
+        mlp.validation_scores_ = []
+        mlp.best_validation_score_ = -np.inf
+        mlp.best_loss_ = None
+    else:
+        mlp.best_loss_ = np.inf
+
+
+def fit_checkpointed(X, y, sample_weight: Optional[np.ndarray], ckpt: Optional[TrainCheckpoint], every: int,
+                     base_model=None, epochs: int = 0):
+    """
+    MLP тренується порціями по `every` епох (warm_start), після кожної модель іде в чекпойнт.
+    Стан early stopping (loss_curve_, best_validation_score_, лічильник без покращень)
+    переживає порції; моменти Adam — ні (sklearn створює оптимізатор на кожен fit),
+    а наприкінці порції з early stopping sklearn відновлює найкращі ваги. Тому траєкторія
+    відрізняється від одного fit і порції вмикаються лише явно (TRAIN_CHECKPOINT_EPOCHS > 0).
+    Скейлер ознак і перетворення цілі фіксуються першою порцією.
+
+    base_model — fine-tuning: старт з ваг (і скейлера) базової моделі флоту, до `epochs`
+    епох з FINETUNE_LR; без чекпойнта все одно порціями, просто нічого не пишеться.
+    """
+    from sklearn.exceptions import ConvergenceWarning
+
+    fit_params = weighted_fit_params(sample_weight)
+    total = epochs or make_model().regressor.named_steps["mlp"].max_iter
+    every = every if every > 0 else total
+    state = {"converged": False}
+
+    def save(model):
+        mlp = model.regressor_.named_steps["mlp"]
+        state["converged"] = mlp.n_iter_ < mlp.max_iter
+        if ckpt is not None:
+            ckpt.save_model(model, epochs=len(mlp.loss_curve_), converged=state["converged"])
+
+    model = ckpt.load_model() if ckpt is not None else None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", ConvergenceWarning)
+        if model is not None:
+            state["converged"] = bool(ckpt.state.get("converged"))
+            print(f"[info] resuming fit at epoch {ckpt.state.get('epochs')}")
+        elif base_model is not None:
+            model = base_model
+            mlp = model.regressor_.named_steps["mlp"]
+            reset_training_state(mlp)
+            mlp.set_params(learning_rate_init=float(os.getenv("FINETUNE_LR", "3e-4")))
+        else:
+            model = make_model()
+            model.set_params(regressor__mlp__max_iter=min(every, total))
+            model.fit(X, y, **fit_params)
+            save(model)
+
+        mlp = model.regressor_.named_steps["mlp"]
+        Xs = model.regressor_[:-1].transform(X)
+        yt = model.transformer_.transform(y.reshape(-1, 1)).ravel()
+        mlp_kw = {"sample_weight": fit_params["mlp__sample_weight"]} if "mlp__sample_weight" in fit_params else {}
+        while not state["converged"] and len(mlp.loss_curve_) < total:
+            mlp.set_params(warm_start=True, max_iter=min(every, total - len(mlp.loss_curve_)))
+            mlp.fit(Xs, yt, **mlp_kw)
+            save(model)
+
+    # збережена модель виглядає як після звичайного fit
+    mlp.set_params(warm_start=False, max_iter=total)
+    mlp.n_iter_ = len(mlp.loss_curve_)
+    return model
+
+
+def fit_and_score(X_train, y_train, X_test, y_test,
+                  sample_weight: Optional[np.ndarray] = None,
+                  checkpoint: Optional[TrainCheckpoint] = None,
+                  checkpoint_every: int = 0,
+                  base_model=None,
+                  epochs: int = 0):
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+    if sample_weight is not None and "mlp__sample_weight" not in weighted_fit_params(sample_weight):
+        # MLP без sample_weight: ваги → кількість копій рядка, розмір вибірки той самий
+        idx = resample_by_weight(sample_weight)
+        X_train, y_train, sample_weight = X_train[idx], y_train[idx], None
+
+    if base_model is not None or (checkpoint is not None and checkpoint_every > 0):
+        model = fit_checkpointed(X_train, y_train, sample_weight, checkpoint, checkpoint_every,
+                                 base_model=base_model, epochs=epochs)
+    else:
+        model = make_model()
+        model.fit(X_train, y_train, **weighted_fit_params(sample_weight))
 
     y_pred = model.predict(X_test)
     y_pred = np.clip(y_pred, 0.0, None)  # ніколи < 0
 
-    mae = mean_absolute_error(y_test, y_pred)
-    rmse = math.sqrt(mean_squared_error(y_test, y_pred))
-    r2 = r2_score(y_test, y_pred)
+    metrics = {
+        "mae": mean_absolute_error(y_test, y_pred),
+        "rmse": math.sqrt(mean_squared_error(y_test, y_pred)),
+        "r2": r2_score(y_test, y_pred),
+    }
+    return model, y_pred, metrics
+
+
+def train_and_evaluate(df_feat: pd.DataFrame, feature_cols: List[str], out_dir: str,
+                       max_per_stratum: int = 0,
+                       speed_bin_kmh: float = 10.0,
+                       throttle_bin: float = 10.0,
+                       rpm_bin: float = 500.0,
+                       compare_full: bool = False,
+                       feature_sketch: Optional[Dict[str, Dict]] = None,
+                       checkpoint: Optional[TrainCheckpoint] = None,
+                       checkpoint_every: int = 0,
+                       base_model=None,
+                       base_info: Optional[Dict[str, str]] = None,
+                       epochs: int = 0) -> Dict[str, float]:
+    """
+    max_per_stratum > 0 вмикає стратифікований сабсемплінг train-частини
+    (тест лишається повним, щоб метрики були порівнянні).
+    compare_full=True додатково тренує модель на всіх рядках і рахує дельту метрик.
+    feature_sketch (fleetml.sketch) потрапляє в meta.json як еталон для drift-у.
+    checkpoint + checkpoint_every > 0 — основна модель тренується порціями епох із чекпойнтами.
+    base_model — замість тренування з нуля дотреновується базова модель флоту (до epochs епох);
+    base_info (версія/шлях бази) потрапляє в meta.json.
+    """
+    from sklearn.model_selection import GroupShuffleSplit
+
+    ensure_dir(out_dir)
+    plots_dir = os.path.join(out_dir, "plots")
+    ensure_dir(plots_dir)
+
+    groups = df_feat["tripId"].values
+    X = df_feat[feature_cols].values
+    y = df_feat["y"].values
+
+    gss = GroupShuffleSplit(n_splits=1, train_size=0.8, random_state=42)
+    train_idx, test_idx = next(gss.split(X, y, groups=groups))
+
+    X_test, y_test = X[test_idx], y[test_idx]
+
+    sample_weight = None
+    fit_idx = train_idx
+    if max_per_stratum > 0:
+        keep, sample_weight = stratified_subsample(
+            df_feat.iloc[train_idx],
+            max_per_stratum=max_per_stratum,
+            speed_bin_kmh=speed_bin_kmh,
+            throttle_bin=throttle_bin,
+            rpm_bin=rpm_bin,
+        )
+        fit_idx = train_idx[keep]
+
+    t_fit = time.time()
+    model, y_pred, metrics = fit_and_score(X[fit_idx], y[fit_idx], X_test, y_test, sample_weight,
+                                           checkpoint=checkpoint, checkpoint_every=checkpoint_every,
+                                           base_model=base_model, epochs=epochs)
+    fit_s = time.time() - t_fit
+    mae, rmse, r2 = metrics["mae"], metrics["rmse"], metrics["r2"]
+
+    report: Dict[str, float] = {
+        "train_rows_full": float(len(train_idx)),
+        "train_rows_used": float(len(fit_idx)),
+        "reduction_ratio": float(len(fit_idx)) / max(1, len(train_idx)),
+        "fit_s": fit_s,
+    }
+    if max_per_stratum > 0 and compare_full:
+        t_full = time.time()
+        _, _, full = fit_and_score(X[train_idx], y[train_idx], X_test, y_test)
+        report["full_fit_s"] = time.time() - t_full
+        for k, v in full.items():
+            report[f"full_{k}"] = v
+            report[f"delta_{k}"] = metrics[k] - v
+    print(f"[info] train rows {len(fit_idx)}/{len(train_idx)} "
+          f"(ratio={report['reduction_ratio']:.3f}, fit={fit_s:.1f}s)")
 
     # save model + columns
     dump(model, os.path.join(out_dir, "model.joblib"))
     with open(os.path.join(out_dir, "feature_columns.json"), "w", encoding="utf-8") as f:
         json.dump(feature_cols, f, ensure_ascii=False, indent=2)
+    # predictor заповнює пропуски тими ж медіанами і готує ознаки з тими ж налаштуваннями, що й при тренуванні
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "feature_version": FEATURE_VERSION,
+            **feature_settings(),
+            "fill_values": {c: float(v) for c, v in df_feat[feature_cols].median().items()},
+            "feature_sketch": feature_sketch or {},
+            "base_model": base_info,
+        }, f, ensure_ascii=False, indent=2)
 
     # plots
     plt.figure()
@@ -457,8 +477,15 @@ def train_and_evaluate(df_feat: pd.DataFrame, feature_cols: List[str], out_dir:
     with open(os.path.join(out_dir, "metrics.txt"), "w", encoding="utf-8") as f:
         f.write(f"Samples: total={len(df_feat)}, train={len(train_idx)}, test={len(test_idx)}\n")
         f.write(f"MAE (mL/s): {mae:.4f}\nRMSE (mL/s): {rmse:.4f}\nR2: {r2:.4f}\n")
+        f.write(f"Train rows used: {len(fit_idx)}/{len(train_idx)} "
+                f"(reduction ratio={report['reduction_ratio']:.4f})\n")
+        if "full_mae" in report:
+            f.write(f"Full-data fit: MAE={report['full_mae']:.4f} RMSE={report['full_rmse']:.4f} "
+                    f"R2={report['full_r2']:.4f}\n")
+            f.write(f"Delta (subsampled - full): MAE={report['delta_mae']:+.4f} "
+                    f"RMSE={report['delta_rmse']:+.4f} R2={report['delta_r2']:+.4f}\n")
 
-    return {"mae": mae, "rmse": rmse, "r2": r2}
+    return {"mae": mae, "rmse": rmse, "r2": r2, **report}
 
 
 # ================ Trainer Flow ================
@@ -489,9 +516,221 @@ def update_manifest_status(manifest: dict, status: str, extra: Optional[dict] =
     Models.update_one({"_id": manifest["_id"]}, {"$set": patch})
 
 
+def job_key(trip_ids: List[ObjectId], *extra: str) -> str:
+    """Трипи + усе, що впливає на семпли й ознаки: чекпойнт чужого джоба не підхопиться."""
+    raw = "|".join([
+        ",".join(sorted(str(t) for t in trip_ids)), FEATURE_VERSION, repr(FeatureParams.from_env()),
+        os.getenv("RESAMPLE_HZ", "0"), os.getenv("GAP_S", "6.0"),
+        os.getenv("SAMPLES_PUSHDOWN", "0"), os.getenv("SAMPLES_BUCKET_S", "0"), *extra,
+    ])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def update_manifest_checkpoint(manifest: dict, key: str, stage: str, info: Optional[dict] = None):
+    Models.update_one({"_id": manifest["_id"]}, {"$set": {
+        "checkpoint": {**(info or {}), "key": key, "stage": stage, "updatedAt": datetime.utcnow()},
+        "updatedAt": datetime.utcnow(),
+    }})
+
+
+def feature_settings() -> Dict[str, object]:
+    """Налаштування підготовки даних, з якими тренується модель (meta.json; predictor їх відтворює)."""
+    pushdown = os.getenv("SAMPLES_PUSHDOWN", "0") == "1"
+    return {
+        "feature_params": FeatureParams.from_env().to_dict(),
+        "resample_hz": float(os.getenv("RESAMPLE_HZ", "0")),
+        "gap_s": float(os.getenv("GAP_S", "6.0")),
+        "samples_bucket_s": float(os.getenv("SAMPLES_BUCKET_S", "0")) if pushdown else 0.0,
+    }
+
+
+def prepare_features(trip_ids: List[ObjectId], ckpt: Optional[TrainCheckpoint]
+                     ) -> Tuple[Optional[pd.DataFrame], List[str], Dict[str, Dict], Optional[str]]:
+    """
+    Етапи samples -> features з чекпойнтами (завершений етап береться з диска).
+    Повертає (df_feat, feature_cols, feature_sketch, код помилки або None).
+    """
+    if ckpt and ckpt.done("features"):
+        saved = ckpt.load_json("features")
+        return ckpt.load_frame("features"), saved["feature_cols"], saved["feature_sketch"], None
+
+    if ckpt and ckpt.done("samples"):
+        df = ckpt.load_frame("samples")
+    else:
+        # Витягнути семпли агрегуванням без конфліктів
+        df = load_samples_for_trips(trip_ids)
+        if df.empty:
+            return None, [], {}, "no_samples"
+        if ckpt:
+            ckpt.save_frame("samples", df)
+            ckpt.mark("samples", rows=len(df))
+
+    # Опційний ресемплінг на фіксовану сітку (обмежує кількість рядків на трип)
+    resample_hz = float(os.getenv("RESAMPLE_HZ", "0"))
+    if resample_hz > 0:
+        n_raw = len(df)
+        df = resample_fixed_rate(df, period_s=1.0 / resample_hz, gap_s=float(os.getenv("GAP_S", "6.0")))
+        print(f"[info] resampled {n_raw} -> {len(df)} rows @ {resample_hz:g} Hz")
+
+    # Підготовка ознак (спільний рушій з predictor-service)
+    df_feat, feature_cols = build_training_features(df, FeatureParams.from_env(), fill_na=False)
+    if df_feat.empty:
+        return None, [], {}, "no_features"
+
+    # Скетчі ознак до заповнення пропусків — еталон для drift-у в predictor-і
+    feature_sketch = sketches_to_dict(fit_sketches(df_feat, feature_cols))
+    df_feat[feature_cols] = df_feat[feature_cols].fillna(df_feat[feature_cols].median())
+    if ckpt:
+        ckpt.save_frame("features", df_feat)
+        ckpt.save_json("features", {"feature_cols": feature_cols, "feature_sketch": feature_sketch})
+        ckpt.mark("features", featureRows=len(df_feat))
+    return df_feat, feature_cols, feature_sketch, None
+
+
+def subsample_settings() -> dict:
+    return {
+        "max_per_stratum": int(os.getenv("SUBSAMPLE_MAX_PER_STRATUM", "0")),
+        "speed_bin_kmh": float(os.getenv("SUBSAMPLE_SPEED_BIN_KMH", "10.0")),
+        "throttle_bin": float(os.getenv("SUBSAMPLE_THROTTLE_BIN", "10.0")),
+        "rpm_bin": float(os.getenv("SUBSAMPLE_RPM_BIN", "500.0")),
+        "compare_full": os.getenv("SUBSAMPLE_COMPARE_FULL", "false").lower() == "true",
+    }
+
+
+# ================ Fleet base model ================
+def fleet_base_dir(version: str) -> str:
+    return os.path.join(MODELS_ROOT, FLEET_DIR, version)
+
+
+def fleet_status(base_dir: str) -> str:
+    """Статус джоба з fleet.json; без файлу чи без status — completed (каталоги до статусів)."""
+    path = os.path.join(base_dir, "fleet.json")
+    if not os.path.exists(path):
+        return "completed"
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("status", "completed")
+
+
+def resolve_base_model(spec: Optional[str]) -> Optional[Tuple[str, str]]:
+    """
+    (версія, каталог) базової моделі флоту; spec — версія або "latest"
+    (найновіша на томі серед завершених: training / failed пропускаються).
+    """
+    if not spec:
+        return None
+    if spec == "latest":
+        root = os.path.join(MODELS_ROOT, FLEET_DIR)
+        found = [os.path.join(root, d) for d in (os.listdir(root) if os.path.isdir(root) else [])
+                 if os.path.exists(os.path.join(root, d, "model.joblib"))
+                 and fleet_status(os.path.join(root, d)) == "completed"]
+        if not found:
+            print("[warn] no fleet base models found, training from scratch")
+            return None
+        base = max(found, key=lambda d: os.path.getmtime(os.path.join(d, "model.joblib")))
+        return os.path.basename(base), base
+    base = fleet_base_dir(spec)
+    if not os.path.exists(os.path.join(base, "model.joblib")):
+        print(f"[warn] fleet base model {spec} not found at {base}, training from scratch")
+        return None
+    return spec, base
+
+
+def load_base_model(base_dir: str, feature_cols: List[str]):
+    """Базова модель, якщо її колонки збігаються з колонками авто; інакше None."""
+    from joblib import load
+
+    with open(os.path.join(base_dir, "feature_columns.json"), encoding="utf-8") as f:
+        base_cols = json.load(f)
+    if base_cols != feature_cols:
+        print("[warn] fleet base columns differ from vehicle features, training from scratch")
+        return None
+    return load(os.path.join(base_dir, "model.joblib"))
+
+
+def update_fleet_status(info_path: str, info: dict, status: str, extra: Optional[dict] = None):
+    """fleet.json — маніфест базової моделі: статус джоба (training / failed / completed) лишається на томі."""
+    info.update({"status": status, "updatedAt": datetime.utcnow().isoformat() + "Z"})
+    if extra:
+        info.update(extra)
+    save_text(info_path, json.dumps(info, ensure_ascii=False, indent=2, default=str))
+
+
+def handle_fleet_job(payload: dict):
+    """
+    payload: {"job": "fleet-base", "version"?: "...", "vehicleIds"?: [...], "maxTrips"?: N}
+
+    Одна базова модель по завершених трипах багатьох авто (один прохід по семплах)
+    у MODELS_ROOT/_fleet/{version}; версії авто потім дотреновуються з неї
+    (baseVersion у повідомленні, baseModel у маніфесті або FLEET_BASE_VERSION).
+    Без version назва береться з ключа джоба — повторна доставка потрапляє в той самий каталог.
+    Статус джоба пишеться у fleet.json (як status маніфесту для авто); failed не блокує повтор.
+    """
+    q: Dict[str, object] = {"status": "completed"}
+    vehicle_oids = [o for o in (to_oid(v) for v in payload.get("vehicleIds") or []) if o]
+    if vehicle_oids:
+        q["vehicleId"] = {"$in": vehicle_oids}
+    max_trips = int(payload.get("maxTrips") or os.getenv("FLEET_MAX_TRIPS", "2000"))
+    trips = list(Trips.find(q, {"_id": 1, "vehicleId": 1}).sort("startTime", -1).limit(max_trips))
+    if not trips:
+        print("[warn] fleet job: no completed trips")
+        return
+
+    trip_ids = [t["_id"] for t in trips]
+    vehicles = sorted({str(t.get("vehicleId")) for t in trips})
+    key = job_key(trip_ids, "fleet")
+    version = payload.get("version") or f"fleet-{key[:10]}"
+    out_dir = fleet_base_dir(version)
+    ensure_dir(out_dir)
+
+    info_path = os.path.join(out_dir, "fleet.json")
+    if os.path.exists(info_path):
+        with open(info_path, encoding="utf-8") as f:
+            done_key = json.load(f).get("key")
+        if done_key == key and fleet_status(out_dir) == "completed":
+            print(f"[info] fleet base {version} already trained for this job, skipping")
+            return
+
+    ckpt = TrainCheckpoint(os.path.join(out_dir, "checkpoint"), key) if CHECKPOINT else None
+    if ckpt and ckpt.stage:
+        print(f"[info] resuming fleet job from checkpoint stage '{ckpt.stage}'")
+    print(f"[info] fleet base {version}: {len(trip_ids)} trips from {len(vehicles)} vehicles")
+    info = {"version": version, "key": key, "vehicles": vehicles, "trips": len(trip_ids)}
+    update_fleet_status(info_path, info, "training")
+
+    try:
+        df_feat, feature_cols, feature_sketch, error = prepare_features(trip_ids, ckpt)
+        if error:
+            update_fleet_status(info_path, info, "failed", {"error": error})
+            print(f"[err] fleet job failed: {error}")
+            return
+
+        metrics = train_and_evaluate(
+            df_feat, feature_cols, out_dir, **subsample_settings(),
+            feature_sketch=feature_sketch,
+            checkpoint=ckpt,
+            checkpoint_every=CHECKPOINT_EPOCHS,
+        )
+    except Exception as e:
+        update_fleet_status(info_path, info, "failed", {"error": str(e)})
+        raise
+    update_fleet_status(info_path, info, "completed", {
+        "rows": len(df_feat), "metrics": metrics, "createdAt": datetime.utcnow().isoformat() + "Z",
+    })
+    if ckpt:
+        ckpt.clear()
+    print(f"[ok] fleet base model saved to {out_dir} :: {metrics}")
+
+
+# ================ Trainer Flow (per vehicle) ================
 def handle_train_job(payload: dict):
     """
-    payload: {"modelId": "...", "vehicleId": "...", "version": "..."}
+    payload: {"modelId": "...", "vehicleId": "...", "version": "...", "baseVersion"?: "..."}
+
+    Етапи (samples -> features -> fit) фіксуються в {out_dir}/checkpoint і в manifest.checkpoint;
+    повторно доставлене повідомлення продовжує з останнього завершеного етапу, а вже
+    завершений джоб з тим самим ключем не перетреновується.
+    Із базовою моделлю флоту (baseVersion / manifest.baseModel / FLEET_BASE_VERSION, "latest" —
+    найновіша) версія авто — коротке дотреновування бази (FINETUNE_EPOCHS), а не тренування з нуля.
     """
     model_id = payload.get("modelId")
     vehicle_id = payload.get("vehicleId")
@@ -511,48 +750,50 @@ def handle_train_job(payload: dict):
         print("[warn] manifest has empty trip lists")
         return
 
-    update_manifest_status(manifest, "training")
+    vehicle_oid = manifest["vehicleId"]
+    vehicle_str = str(vehicle_oid)
+    version_str = manifest["version"]
+    out_dir = os.path.join(MODELS_ROOT, vehicle_str, version_str)
+    ensure_dir(out_dir)
 
-    # Витягнути семпли агрегуванням без конфліктів
-    df = load_samples_for_trips(all_ids)
-    if df.empty:
-        update_manifest_status(manifest, "failed", {"error": "no_samples"})
-        print("[err] no samples found for given trips")
+    base = resolve_base_model(payload.get("baseVersion") or manifest.get("baseModel")
+                              or os.getenv("FLEET_BASE_VERSION", ""))
+    key = job_key(all_ids, base[0] if base else "")
+    done = manifest.get("checkpoint") or {}
+    if manifest.get("status") == "completed" and done.get("stage") == "completed" and done.get("key") == key:
+        print(f"[info] model {vehicle_str}/{version_str} already trained for this job, skipping")
         return
 
-    # Підготовка ознак
-    df_feat, feature_cols = build_features(
-        df,
-        min_speed_kmh=float(os.getenv("MIN_SPEED_KMH", "0.0")),
-        gap_s=float(os.getenv("GAP_S", "6.0")),
-        alpha=float(os.getenv("ALPHA", "0.6")),
-        break_s=float(os.getenv("BREAK_S", "120.0")),
-        drop_idle=os.getenv("DROP_IDLE", "false").lower() == "true",
-        idle_speed_kmh=float(os.getenv("IDLE_SPEED_KMH", "0.05")),
-        idle_fuel_mls=float(os.getenv("IDLE_FUEL_MLS", "0.005")),
-        mismatch_kmh=float(os.getenv("MISMATCH_KMH", "15.0")),
-        a_accel_max_ms2=float(os.getenv("A_ACCEL_MAX_MS2", "6.0")),
-        a_decel_max_ms2=float(os.getenv("A_DECEL_MAX_MS2", "6.0")),
-        phys_margin_kmh=float(os.getenv("PHYS_MARGIN_KMH", "5.0")),
-        gps_same_eps_m=float(os.getenv("GPS_SAME_EPS_M", "2.0")),
-        gps_min_span_s=float(os.getenv("GPS_MIN_SPAN_S", "1.5")),
-        gps_max_span_s=float(os.getenv("GPS_MAX_SPAN_S", "15.0")),
-        vmax_kmh=float(os.getenv("VMAX_KMH", "160.0")),
-    )
+    ckpt = None
+    if CHECKPOINT:
+        ckpt = TrainCheckpoint(os.path.join(out_dir, "checkpoint"), key,
+                               on_mark=lambda stage, info: update_manifest_checkpoint(manifest, key, stage, info))
+        if ckpt.stage:
+            print(f"[info] resuming job from checkpoint stage '{ckpt.stage}'")
 
-    if df_feat.empty:
-        update_manifest_status(manifest, "failed", {"error": "no_features"})
-        print("[err] df_feat empty after feature build")
+    update_manifest_status(manifest, "training")
+
+    df_feat, feature_cols, feature_sketch, error = prepare_features(all_ids, ckpt)
+    if error:
+        update_manifest_status(manifest, "failed", {"error": error})
+        print(f"[err] training failed: {error}")
         return
 
-    # Тренування + збереження
-    vehicle_oid = manifest["vehicleId"]
-    vehicle_str = str(vehicle_oid)
-    version_str = manifest["version"]
-    out_dir = os.path.join(MODELS_ROOT, vehicle_str, version_str)
-    ensure_dir(out_dir)
+    base_model = load_base_model(base[1], feature_cols) if base else None
+    base_info = {"version": base[0], "path": base[1]} if base_model is not None else None
+    if base_info:
+        print(f"[info] fine-tuning from fleet base {base[0]}")
 
-    metrics = train_and_evaluate(df_feat, feature_cols, out_dir)
+    # Тренування + збереження
+    metrics = train_and_evaluate(
+        df_feat, feature_cols, out_dir, **subsample_settings(),
+        feature_sketch=feature_sketch,
+        checkpoint=ckpt,
+        checkpoint_every=CHECKPOINT_EPOCHS,
+        base_model=base_model,
+        base_info=base_info,
+        epochs=int(os.getenv("FINETUNE_EPOCHS", "40")) if base_model is not None else 0,
+    )
 
     # Оновити маніфест
     update_manifest_status(manifest, "completed", {
@@ -560,13 +801,98 @@ def handle_train_job(payload: dict):
             "path": out_dir,
             "model_file": "model.joblib",
             "columns_file": "feature_columns.json",
+            "meta_file": "meta.json",
             "plots_dir": "plots",
         },
-        "metrics": metrics
+        "metrics": metrics,
+        "featureSketch": feature_sketch,
+        "baseModel": base_info["version"] if base_info else None,
+        "checkpoint": {"key": key, "stage": "completed", "updatedAt": datetime.utcnow()},
     })
+    # проміжні файли більше не потрібні (великі для великих авто)
+    if ckpt:
+        ckpt.clear()
     print(f"[ok] trained model saved to {out_dir} :: {metrics}")
 
 
+# ================ Sharding ================
+def forward_to_shard(ch, properties, body: bytes, target_queue: str):
+    headers = dict(properties.headers or {})
+    headers[HOPS_HEADER] = next_hops(properties.headers)
+    ch.queue_declare(queue=target_queue, durable=True)
+    ch.basic_publish(
+        exchange="",
+        routing_key=target_queue,
+        body=body,
+        properties=pika.BasicProperties(headers=headers, delivery_mode=2, content_type=properties.content_type),
+    )
+
+
+def shard_owner(payload: dict, properties) -> Optional[str]:
+    """Репліка-власник vehicleId, якщо це не ми; None — обробляємо тут."""
+    if SHARDING is None or not payload.get("vehicleId"):
+        return None
+    if int((properties.headers or {}).get(HOPS_HEADER, 0)) >= MAX_HOPS:
+        return None
+    owner = SHARDING.owner(payload["vehicleId"])
+    return None if owner == SHARDING.replica_id else owner
+
+
+def drain_orphan_shards(conn, ch):
+    """
+    Лідер переносить задачі з черг реплік, що вийшли, до нових власників.
+    Черга, яку ще хтось споживає (репліка жива, лише пропустила heartbeat-и), не чіпається;
+    видаляється лише порожня і без споживачів (if_unused) — інакше репліка не забувається
+    і черга дренується на наступному циклі.
+    """
+    try:
+        for orphan in SHARDING.orphans():
+            oq = shard_queue(QUEUE_IN, orphan)
+            tmp = conn.channel()
+            try:
+                declared = tmp.queue_declare(queue=oq, durable=True, passive=True)
+            except Exception:
+                SHARDING.forget(orphan)  # черги вже нема
+                continue
+            if declared.method.consumer_count > 0:
+                print(f"[shard] '{oq}' still has {declared.method.consumer_count} consumer(s); not draining")
+                tmp.close()
+                continue
+            moved, drained = 0, True
+            while True:
+                method, props, body = tmp.basic_get(queue=oq, auto_ack=False)
+                if method is None:
+                    break
+                try:
+                    payload = json.loads(body.decode("utf-8"))
+                except Exception:
+                    payload = {}
+                target = shard_owner(payload, props) or SHARDING.replica_id
+                try:
+                    forward_to_shard(ch, props, body, shard_queue(QUEUE_IN, target))
+                except Exception as e:
+                    print(f"[err] forward from '{oq}' failed:", e)
+                    tmp.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+                    drained = False
+                    break
+                tmp.basic_ack(delivery_tag=method.delivery_tag)
+                moved += 1
+            if drained:
+                try:
+                    tmp.queue_delete(queue=oq, if_unused=True, if_empty=True)
+                except Exception as e:  # споживач з'явився або надійшли нові задачі — брокер закрив канал
+                    print(f"[shard] '{oq}' not deleted: {e}")
+                    drained = False
+            if tmp.is_open:
+                tmp.close()
+            if drained:
+                SHARDING.forget(orphan)
+            print(f"[shard] drained {moved} jobs from '{oq}'")
+    except Exception as e:
+        print("[err] orphan shard drain failed:", e)
+    conn.call_later(SHARDING.heartbeat_s, lambda: drain_orphan_shards(conn, ch))
+
+
 # ================ Main loop ================
 def on_message(ch, method, properties, body):
     try:
@@ -576,10 +902,27 @@ def on_message(ch, method, properties, body):
         ch.basic_ack(delivery_tag=method.delivery_tag)
         return
 
+    target = shard_owner(payload, properties)
+    if target is not None:
+        try:
+            forward_to_shard(ch, properties, body, shard_queue(QUEUE_IN, target))
+        except Exception as e:
+            # задача лишається в черзі (повернеться цій або іншій репліці)
+            print(f"[err] forward to '{target}' failed:", e)
+            if ch.is_open:
+                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            return
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+        print(f"[shard] vehicle {payload.get('vehicleId')} -> {target}")
+        return
+
     print(f"[info] received: {payload}")
     t0 = time.time()
     try:
-        handle_train_job(payload)
+        if payload.get("job") == "fleet-base":
+            handle_fleet_job(payload)
+        else:
+            handle_train_job(payload)
         ch.basic_ack(delivery_tag=method.delivery_tag)
     except Exception as e:
         print("[err] training failed:", e)
@@ -592,8 +935,17 @@ def on_message(ch, method, properties, body):
 
 
 def main():
+    global SHARDING
     mongo_connect()
     conn, ch = make_channel()
+    if os.getenv("SHARDING", "0") == "1":
+        SHARDING = ShardMembership.from_env(db["shard_members"], "trainer")
+        SHARDING.start()
+        own_queue = shard_queue(QUEUE_IN, SHARDING.replica_id)
+        ch.queue_declare(queue=own_queue, durable=True)
+        ch.basic_consume(queue=own_queue, on_message_callback=on_message)
+        conn.call_later(SHARDING.heartbeat_s, lambda: drain_orphan_shards(conn, ch))
+        print(f"[ready] shard replica '{SHARDING.replica_id}' also consuming '{own_queue}'")
     print(f"[ready] waiting jobs in '{QUEUE_IN}' ...")
     ch.basic_consume(queue=QUEUE_IN, on_message_callback=on_message)
     try:
@@ -606,6 +958,8 @@ def main():
         except Exception:
             pass
         conn.close()
+        if SHARDING:
+            SHARDING.stop()
         if mongo_client:
             mongo_client.close()
 
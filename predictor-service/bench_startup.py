@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк старту predictor-а (кожен замір — окремий процес):
+  import      — час `import predictor` (без старту інтерпретатора)
+  cold        — від запуску процесу до першого predictionSummary (імпорт + unpickle + прогноз)
+  warm        — перший прогноз після warm_up (те, що бачить перший запит після [ready])
+
+  PYTHONPATH=..:. python bench_startup.py [--runs 5] [--models-dir D --vehicle-id V --version X] [--out startup.jsonl]
+
+Без --models-dir модель (MLP як у trainer-і) тренується на синтетиці в тимчасовому каталозі.
+Результат — один JSON-рядок (медіани по runs); з --out він дописується у файл, щоб
+відстежувати зміни між комітами.
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+TRIP_SAMPLES = 3600
+
+
+def _child(mode: str, t_spawn: float, models_dir: str, vehicle_id: str, version: str):
+    t0 = time.perf_counter()
+    import predictor
+    t_import = time.perf_counter() - t0
+    if mode == "import":
+        return {"importS": t_import}
+
+    import pandas as pd
+    from fleetml.synthetic import synthetic_trip
+    df = pd.json_normalize(synthetic_trip(TRIP_SAMPLES, trip_id="bench", seed=1))
+
+    store = predictor.LocalModelStore(models_dir)
+    if mode == "warm":
+        store.scan()
+        store.warm(vehicle_id, version)
+    t1 = time.perf_counter()
+    pkg = store.load(vehicle_id, version)
+    predictor.compute_prediction_summary(df, pkg["model"], pkg["feature_cols"],
+                                         fill_values=pkg["meta"].get("fill_values"))
+    out = {"importS": t_import, "firstPredictionS": time.perf_counter() - t1}
+    if mode == "cold":
+        out["timeToFirstPredictionS"] = time.time() - t_spawn
+    return out
+
+
+def _train_model(models_dir: str, vehicle_id: str, version: str):
+    """Невелика модель у форматі trainer-а (model.joblib + feature_columns.json + meta.json)."""
+    from joblib import dump
+    from sklearn.compose import TransformedTargetRegressor
+    from sklearn.neural_network import MLPRegressor
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    from fleetml.features import FEATURE_VERSION, build_training_features, flatten_samples
+    from fleetml.synthetic import synthetic_fleet
+
+    df_feat, cols = build_training_features(flatten_samples(synthetic_fleet(n_trips=3, n=1500)))
+    model = TransformedTargetRegressor(
+        regressor=Pipeline([("scaler", StandardScaler()),
+                            ("mlp", MLPRegressor(hidden_layer_sizes=(64, 32), max_iter=50, random_state=42))]),
+        transformer=StandardScaler(),
+    )
+    model.fit(df_feat[cols].values, df_feat["y"].values)
+    out_dir = os.path.join(models_dir, vehicle_id, version)
+    os.makedirs(out_dir, exist_ok=True)
+    dump(model, os.path.join(out_dir, "model.joblib"))
+    with open(os.path.join(out_dir, "feature_columns.json"), "w", encoding="utf-8") as f:
+        json.dump(cols, f)
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"feature_version": FEATURE_VERSION,
+                   "fill_values": {c: float(v) for c, v in df_feat[cols].median().items()}}, f)
+
+
+def _run(mode: str, args) -> dict:
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", mode, "--t-spawn", repr(time.time()),
+           "--models-dir", args.models_dir, "--vehicle-id", args.vehicle_id, "--version", args.version]
+    env = dict(os.environ, LOG_LEVEL="WARNING")
+    res = subprocess.run(cmd, capture_output=True, text=True, env=env, check=True)
+    return json.loads(res.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser("predictor startup benchmark")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--models-dir", default=None)
+    ap.add_argument("--vehicle-id", default="bench")
+    ap.add_argument("--version", default="v1")
+    ap.add_argument("--out", default=None, help="append the JSON result to this file")
+    ap.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    ap.add_argument("--t-spawn", type=float, default=0.0, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(_child(args.child, args.t_spawn, args.models_dir, args.vehicle_id, args.version)))
+        return
+
+    tmp = None
+    if not args.models_dir:
+        tmp = tempfile.TemporaryDirectory()
+        args.models_dir = tmp.name
+        _train_model(args.models_dir, args.vehicle_id, args.version)
+
+    result = {"at": datetime.datetime.utcnow().isoformat(timespec="seconds") + "Z",
+              "python": sys.version.split()[0], "runs": args.runs, "tripSamples": TRIP_SAMPLES}
+    for mode in ("import", "cold", "warm"):
+        runs = [_run(mode, args) for _ in range(args.runs)]
+        for key in runs[0]:
+            result[f"{mode}.{key}"] = round(statistics.median(r[key] for r in runs), 4)
+
+    line = json.dumps(result)
+    print(line)
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    if tmp:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+
+from fleetml.synthetic import synthetic_trip
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "predictor-service"))
+import predictor  # noqa: E402
+
+
+class LinearModel:
+    def predict(self, X):
+        return np.asarray(X, dtype=float) @ np.array([0.01, 0.0004, 0.02]) + 0.3
+
+
+def test_idle_and_motion_fuel_add_up_to_total():
+    df_raw = pd.json_normalize(synthetic_trip(3000, trip_id=ObjectId(), seed=6))
+    s = predictor.compute_prediction_summary(df_raw, LinearModel(), ["speedKmh", "obd_rpm", "obd_throttle"])
+    assert s["fuelUsedInIdleL"] > 0 and s["fuelUsedInMotionL"] > 0
+    # кожне з трьох округлене до 0.01
+    assert abs(s["fuelUsedInIdleL"] + s["fuelUsedInMotionL"] - s["fuelUsedL"]) <= 0.015
+    # відрізки дистанції покривають увесь трип (холостий хід — у поточному відрізку)
+    buckets = s["fuelPerDistance"]
+    assert abs(sum(b["fuelUsedL"] for b in buckets) - s["fuelUsedL"]) <= 0.005 + 0.0005 * len(buckets)
+
+
+def test_long_trip_caps_distance_buckets():
+    t = np.arange(0.0, 6 * 3600.0, 1.0)
+    speed = np.where(t < 600, 0.0, 100.0)  # 10 хв на холостому, далі 100 км/год
+    y_pred = np.full(len(t), 1.2)
+    a = predictor.trip_analytics(t, speed, y_pred, bucket_km=1.0)
+
+    assert a["distanceKm"] > 500
+    assert len(a["fuelPerDistance"]) <= 200
+    assert a["distanceBucketKm"] > 1.0 and float(a["distanceBucketKm"]).is_integer()
+    fuel_L = float((y_pred[1:] * np.diff(t)).sum()) / 1000.0
+    assert abs(a["fuelUsedInIdleL"] + a["fuelUsedInMotionL"] - fuel_L) <= 0.01
+    buckets = a["fuelPerDistance"]
+    assert abs(sum(b["fuelUsedL"] for b in buckets) - fuel_L) <= 0.0005 * len(buckets)
+    assert a["idleDurationSec"] == 599.0  # інтервал 599..600 с — уже розгін (середня швидкість 50)
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+from fleetml.buckets import COLUMN_DTYPES, decode_buckets, encode_buckets
+from fleetml.features import FEATURE_COLS, build_serving_features, flatten_samples
+from fleetml.synthetic import synthetic_fleet
+
+
+def test_bucket_round_trip_keeps_features():
+    flat = flatten_samples(synthetic_fleet(n_trips=1, n=2500, seed=5))
+    buckets = encode_buckets("trip-0", flat, size=1000)
+    assert [b["n"] for b in buckets] == [1000, 1000, 500]
+
+    back = decode_buckets(buckets)
+    assert list(back.columns) == ["tripId"] + list(COLUMN_DTYPES)
+    pd.testing.assert_series_equal(back["timestamp"], pd.to_datetime(flat["timestamp"], utc=True),
+                                   check_names=False, check_dtype=False)
+    np.testing.assert_array_equal(back["gps_latitude"], flat["gps_latitude"])
+
+    # float32 для OBD: ознаки збігаються з точністю до округлення
+    f0 = build_serving_features(flat)[FEATURE_COLS].to_numpy()
+    f1 = build_serving_features(back)[FEATURE_COLS].to_numpy()
+    np.testing.assert_allclose(f1, f0, rtol=1e-5, atol=1e-4, equal_nan=True)
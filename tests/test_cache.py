@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+import datetime
+import os
+import sys
+
+import numpy as np
+import pytest
+from bson import ObjectId
+
+from fleetml.buckets import compact_trip
+from fleetml.synthetic import synthetic_trip
+
+mongomock = pytest.importorskip("mongomock")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "predictor-service"))
+import predictor  # noqa: E402
+
+COLS = ["speedKmh", "accel_ms2", "obd_rpm", "obd_throttle"]
+
+
+class LinearModel:
+    def predict(self, X):
+        return np.asarray(X, dtype=float) @ np.array([0.01, 0.3, 0.0004, 0.02]) + 0.1
+
+
+def _runtime(monkeypatch, client):
+    monkeypatch.setenv("DRIFT_MONITOR", "0")
+    monkeypatch.setenv("PRED_SERIES_LEVELS", "")
+    rt = predictor.PredictorRuntime("mongodb://localhost:1", "fleetms", "/nonexistent")
+    rt.mongo = client
+    rt.loads = 0
+
+    def load(vehicle_id, version):
+        rt.loads += 1
+        return {"model": LinearModel(), "feature_cols": COLS, "meta": {}, "version": version}
+
+    monkeypatch.setattr(rt.store, "load", load)
+    return rt
+
+
+def _trip(client, n=400):
+    db = client.fleetms
+    trip_id = ObjectId()
+    db.trips.insert_one({"_id": trip_id, "vehicleId": "veh", "status": "completed"})
+    db.samples.insert_many(synthetic_trip(n, trip_id=trip_id, seed=3))
+    return db, str(trip_id)
+
+
+def _key(rt, trip_id):
+    return predictor.prediction_cache_key(rt.mongo, rt.db, trip_id, "veh", "v1", rt.feature_fp)
+
+
+def test_cache_hit_and_key_survives_compaction(monkeypatch):
+    client = mongomock.MongoClient()
+    rt = _runtime(monkeypatch, client)
+    db, trip_id = _trip(client)
+
+    summary, cached = rt.predict_trip(trip_id, "veh", "v1")
+    assert not cached and rt.loads == 1
+    key = _key(rt, trip_id)
+    assert key["numSamples"] == 400
+    assert predictor.cached_prediction(rt.mongo, rt.db, trip_id, key) == summary
+
+    # бакети замість сирих семплів: той самий n і tMax — той самий ключ, кеш не злітає
+    compact_trip(db, ObjectId(trip_id), size=150)
+    assert _key(rt, trip_id) == key
+    assert rt.predict_trip(trip_id, "veh", "v1") == (summary, True)
+    assert rt.loads == 1
+
+
+def test_new_samples_miss(monkeypatch):
+    client = mongomock.MongoClient()
+    rt = _runtime(monkeypatch, client)
+    db, trip_id = _trip(client)
+    rt.predict_trip(trip_id, "veh", "v1")
+    key = _key(rt, trip_id)
+
+    # той самий count, пізніший останній timestamp
+    last = db.samples.find_one({}, sort=[("timestamp", -1)])
+    db.samples.update_one({"_id": last["_id"]},
+                          {"$set": {"timestamp": last["timestamp"] + datetime.timedelta(seconds=5)}})
+    moved = _key(rt, trip_id)
+    assert moved["numSamples"] == key["numSamples"] and moved["maxTimestamp"] != key["maxTimestamp"]
+    assert predictor.cached_prediction(rt.mongo, rt.db, trip_id, moved) is None
+
+    # дописаний семпл: інший count
+    extra = dict(last, timestamp=last["timestamp"] + datetime.timedelta(seconds=10))
+    extra.pop("_id")
+    db.samples.insert_one(extra)
+    assert _key(rt, trip_id)["numSamples"] == key["numSamples"] + 1
+    assert rt.predict_trip(trip_id, "veh", "v1")[1] is False
+    assert rt.loads == 2
+
+
+def test_force_and_disabled_cache_bypass(monkeypatch):
+    client = mongomock.MongoClient()
+    rt = _runtime(monkeypatch, client)
+    _, trip_id = _trip(client)
+    rt.predict_trip(trip_id, "veh", "v1")
+
+    assert rt.predict_trip(trip_id, "veh", "v1", force=True)[1] is False
+    assert rt.loads == 2
+
+    monkeypatch.setenv("PREDICT_CACHE", "0")
+    rt_off = _runtime(monkeypatch, client)
+    assert rt_off.predict_trip(trip_id, "veh", "v1")[1] is False
+    assert rt_off.loads == 1
+
+
+def test_summary_version_and_feature_params_invalidate(monkeypatch):
+    client = mongomock.MongoClient()
+    rt = _runtime(monkeypatch, client)
+    _, trip_id = _trip(client)
+    rt.predict_trip(trip_id, "veh", "v1")
+    assert _runtime(monkeypatch, client).predict_trip(trip_id, "veh", "v1")[1] is True
+
+    monkeypatch.setattr(predictor, "SUMMARY_VERSION", predictor.SUMMARY_VERSION + "-next")
+    rt_summary = _runtime(monkeypatch, client)
+    assert rt_summary.feature_fp != rt.feature_fp
+    assert rt_summary.predict_trip(trip_id, "veh", "v1")[1] is False
+    monkeypatch.undo()
+
+    monkeypatch.setenv("VMAX_KMH", "150")
+    rt_params = _runtime(monkeypatch, client)
+    assert rt_params.feature_fp not in (rt.feature_fp, rt_summary.feature_fp)
+    assert rt_params.predict_trip(trip_id, "veh", "v1")[1] is False
+
+
+def test_samples_written_after_compaction_win_over_buckets(monkeypatch):
+    client = mongomock.MongoClient()
+    rt = _runtime(monkeypatch, client)
+    db, trip_id = _trip(client)
+    compact_trip(db, ObjectId(trip_id), size=150)
+    assert predictor.sample_stats(rt.mongo, rt.db, trip_id)[1] is True
+    summary, _ = rt.predict_trip(trip_id, "veh", "v1")
+
+    # семпли, дописані після компакції: бакети застаріли — і ключ, і дані з сирих samples
+    last = db.samples.find_one({}, sort=[("timestamp", -1)])
+    late = synthetic_trip(50, trip_id=ObjectId(trip_id), seed=8,
+                          start=last["timestamp"] + datetime.timedelta(seconds=1))
+    db.samples.insert_many(late)
+    (n, max_ts), bucketed = predictor.sample_stats(rt.mongo, rt.db, trip_id)
+    assert not bucketed and n == 450 and max_ts > last["timestamp"]
+    _, df = predictor.fetch_trip_and_samples(rt.mongo, rt.db, trip_id)
+    assert len(df) == 450 and "obd.fuelConsumptionRate" in df.columns
+    fresh, cached = rt.predict_trip(trip_id, "veh", "v1")
+    assert not cached and fresh != summary
+
+    # сирих уже нема (компакція з delete_raw) — бакети
+    compact_trip(db, ObjectId(trip_id), size=150, delete_raw=True)
+    (n, _), bucketed = predictor.sample_stats(rt.mongo, rt.db, trip_id)
+    assert bucketed and n == 450
+    _, df = predictor.fetch_trip_and_samples(rt.mongo, rt.db, trip_id)
+    assert len(df) == 450 and "fuelRate" in df.columns
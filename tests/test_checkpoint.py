@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from bson import ObjectId
+
+from fleetml.checkpoint import TrainCheckpoint
+from fleetml.features import flatten_samples
+from fleetml.synthetic import synthetic_trip
+
+
+def test_frame_round_trip_and_key_reset(tmp_path):
+    df = flatten_samples(pd.json_normalize(synthetic_trip(300, trip_id=ObjectId(), seed=2)))
+    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+
+    ckpt = TrainCheckpoint(str(tmp_path / "checkpoint"), key="a")
+    ckpt.save_frame("samples", df)
+    ckpt.mark("samples", rows=len(df))
+    assert ckpt.done("samples") and not ckpt.done("features")
+
+    again = TrainCheckpoint(str(tmp_path / "checkpoint"), key="a")
+    assert again.stage == "samples" and again.state["rows"] == len(df)
+    pd.testing.assert_frame_equal(again.load_frame("samples"), df)
+
+    # інший джоб — чекпойнт скидається
+    other = TrainCheckpoint(str(tmp_path / "checkpoint"), key="b")
+    assert other.stage is None and not (tmp_path / "checkpoint" / "samples.npz").exists()
+
+
+def _trainer():
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "model-trainer"))
+    import app
+
+    return app
+
+
+def _regression(n=600, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 4))
+    y = np.exp(0.3 * X[:, 0] - 0.2 * X[:, 1]) + 0.05 * rng.random(n)
+    return X, y
+
+
+def test_fit_checkpointed_resumes_from_saved_chunk(tmp_path):
+    app = _trainer()
+    X, y = _regression()
+    root = str(tmp_path / "checkpoint")
+
+    def crash(stage, info):
+        if info.get("epochs", 0) >= 10:
+            raise RuntimeError("worker died")
+
+    with pytest.raises(RuntimeError):
+        app.fit_checkpointed(X, y, None, TrainCheckpoint(root, "job", on_mark=crash), every=5, epochs=30)
+
+    ckpt = TrainCheckpoint(root, "job")
+    assert ckpt.stage == "fit" and ckpt.state["epochs"] == 10
+    saved = ckpt.load_model().regressor_.named_steps["mlp"].loss_curve_[:]
+    model = app.fit_checkpointed(X, y, None, ckpt, every=5, epochs=30)
+    mlp = model.regressor_.named_steps["mlp"]
+    # продовження, а не новий старт: перші 10 епох — зі збереженої порції
+    assert mlp.loss_curve_[:10] == saved and 10 < len(mlp.loss_curve_) <= 30
+    assert mlp.n_iter_ == len(mlp.loss_curve_) and not mlp.warm_start
+
+
+def test_training_without_chunks_is_plain_fit(tmp_path):
+    app = _trainer()
+    X, y = _regression(seed=1)
+    ckpt = TrainCheckpoint(str(tmp_path / "checkpoint"), "job")
+    model, _, _ = app.fit_and_score(X, y, X[:50], y[:50], checkpoint=ckpt, checkpoint_every=0)
+    plain = app.make_model().fit(X, y)
+    np.testing.assert_array_equal(model.predict(X[:20]), plain.predict(X[:20]))
+    assert ckpt.load_model() is None
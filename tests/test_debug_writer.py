@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "predictor-service"))
+import predictor  # noqa: E402
+
+
+def _frames(rows=50):
+    X = pd.DataFrame({"speedKmh": range(rows), "obd_rpm": [1500.0] * rows})
+    return X, X.rename(columns={"speedKmh": "gps.speed"})
+
+
+def _wait(cond, timeout=5.0):
+    t0 = time.monotonic()
+    while not cond():
+        assert time.monotonic() - t0 < timeout
+        time.sleep(0.01)
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path, monkeypatch):
+    gate = threading.Event()
+    writer = predictor.DebugArtifactWriter(str(tmp_path), max_queue=2)
+    monkeypatch.setattr(writer, "_write", lambda job: gate.wait(5))
+    X, raw = _frames()
+
+    assert writer.submit("t0", X, raw, {})
+    _wait(writer.queue.empty)  # t0 у потоці, запис висить на gate
+    t0 = time.monotonic()
+    accepted = [writer.submit(f"t{i}", X, raw, {}) for i in range(1, 6)]
+    assert time.monotonic() - t0 < 1.0
+    assert accepted == [True, True, False, False, False]
+    assert writer.stats["dropped"] == 3 and writer.stats["submitted"] == 6
+    gate.set()
+    writer.close()
+
+
+def test_zero_sample_rate_writes_nothing(tmp_path):
+    writer = predictor.DebugArtifactWriter(str(tmp_path / "dbg"), sample_rate=0.0)
+    X, raw = _frames()
+    assert not any(writer.submit(f"t{i}", X, raw, {}) for i in range(5))
+    writer.close()
+    assert writer.stats["sampled_out"] == 5 and writer.stats["written"] == 0
+    assert list((tmp_path / "dbg").iterdir()) == []
+
+
+def test_eviction_removes_oldest_files_first(tmp_path):
+    ddir = tmp_path / "dbg"
+    ddir.mkdir()
+    old = ddir / "old_X_head.csv"
+    old.write_text("x" * 100)
+    os.utime(old, (1_000, 1_000))
+    X, raw = _frames(rows=20)
+
+    probe = predictor.DebugArtifactWriter(str(tmp_path / "probe"))
+    probe.submit("p", X, raw, {"i": 0})
+    probe.close()
+    trip_bytes = sum(f.stat().st_size for f in (tmp_path / "probe").iterdir())
+
+    # місця на два трипи: третій витісняє файл, що лежав до старту, і перший трип
+    writer = predictor.DebugArtifactWriter(str(ddir), max_bytes=2 * trip_bytes + 5)
+    for i in range(3):
+        writer.submit(f"t{i}", X, raw, {"i": i})
+        _wait(lambda: writer.stats["written"] == i + 1)
+    writer.close()
+
+    names = sorted(f.name for f in ddir.iterdir())
+    assert "old_X_head.csv" not in names
+    assert not any(n.startswith("t0_") for n in names)
+    assert sum(n.startswith("t1_") for n in names) == sum(n.startswith("t2_") for n in names) == 3
+    assert writer.stats["evicted"] == 4
+    assert sum(f.stat().st_size for f in ddir.iterdir()) <= 2 * trip_bytes + 5
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fleetml.sketch import fit_sketches, sketches_to_dict
+
+mongomock = pytest.importorskip("mongomock")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "predictor-service"))
+from predictor import DriftMonitor  # noqa: E402
+
+
+class _Unlocked:
+    """Колекція, що падає, якщо її викликають під локом монітора (Mongo на шляху скорингу)."""
+    def __init__(self, col):
+        self.col, self.monitors, self.calls = col, [], 0
+
+    def __getattr__(self, name):
+        def call(*a, **kw):
+            assert not any(m._lock.locked() for m in self.monitors), f"{name} under DriftMonitor lock"
+            self.calls += 1
+            return getattr(self.col, name)(*a, **kw)
+        return call
+
+
+def _data(seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({"a": rng.normal(size=4000), "b": rng.normal(size=4000)})
+    return X, sketches_to_dict(fit_sketches(X, ["a", "b"]))
+
+
+def test_replicas_merge_and_cache_others():
+    X, ref = _data()
+    col = _Unlocked(mongomock.MongoClient().db.feature_drift)
+    r1 = DriftMonitor(col, replica_id="r1", refresh_s=3600.0, flush_s=0.0)
+    r2 = DriftMonitor(col, replica_id="r2", refresh_s=0.0, flush_s=0.0)
+    col.monitors = [r1, r2]
+
+    for _ in range(3):
+        r1.observe("veh", "v1", X.iloc[:500], ref)
+    r2.observe("veh", "v1", X.iloc[500:800], ref)
+    docs = {d["replicaId"]: d for d in col.col.find()}
+    assert docs["r1"]["trips"] == 3 and docs["r1"]["sketch"]["a"]["n"] == 1500
+    assert docs["r2"]["trips"] == 1 and docs["r2"]["driftTrips"] == 4  # r2 бачить трипи r1
+
+    # r1 кешує інших на refresh_s: нові трипи r2 не читаються на кожному трипі
+    r2.observe("veh", "v1", X.iloc[800:900], ref)
+    calls = col.calls
+    r1.observe("veh", "v1", X.iloc[:100], ref)
+    assert col.calls == calls + 1  # лише запис власного документа
+    # кеш r1 — з його першого трипу, коли документа r2 ще не було
+    assert col.col.find_one({"replicaId": "r1"})["driftTrips"] == 4
+
+    r1.refresh_s = 0.0
+    r1.flush()  # перечитує застарілий кеш
+    r1.observe("veh", "v1", X.iloc[:100], ref)
+    assert col.col.find_one({"replicaId": "r1"})["driftTrips"] == 5 + 2
+
+    # рестарт репліки підхоплює власний документ
+    again = DriftMonitor(col.col, replica_id="r1", flush_s=0.0)
+    again.observe("veh", "v1", X.iloc[:10], ref)
+    assert col.col.find_one({"replicaId": "r1"})["trips"] == 6
+
+
+def test_writes_are_batched():
+    X, ref = _data(1)
+    col = _Unlocked(mongomock.MongoClient().db.feature_drift)
+    mon = DriftMonitor(col, replica_id="r1", flush_s=3600.0)
+    col.monitors = [mon]
+    for _ in range(5):
+        mon.observe("veh", "v1", X.iloc[:200], ref)
+    assert col.col.count_documents({}) == 0
+    mon.flush()
+    doc = col.col.find_one({"replicaId": "r1"})
+    assert doc["trips"] == 5 and doc["sketch"]["a"]["n"] == 1000 and doc["drift"]["maxPsi"] is not None
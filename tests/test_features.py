@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fleetml.features import (
+    FEATURE_COLS, FeatureParams, build_serving_features, build_serving_matrix, build_training_features,
+    flatten_samples, gps_speed_kmh, haversine_km, rolling_mean, rolling_median, rolling_std, _bounds,
+)
+from fleetml.synthetic import synthetic_fleet
+
+
+@pytest.fixture(scope="module")
+def fleet_flat() -> pd.DataFrame:
+    return flatten_samples(synthetic_fleet(n_trips=3, n=1500, seed=7))
+
+
+def _reference_gps_speed(lat, lon, ts, p: FeatureParams) -> np.ndarray:
+    """Скалярна реалізація з попереднього trainer-а (еталон для векторизованої)."""
+    n = len(lat)
+    out = np.full(n, np.nan)
+    anchor = 0
+    while anchor < n - 1:
+        j = anchor + 1
+        while j < n:
+            d = haversine_km(lat[anchor], lon[anchor], lat[j], lon[j]) * 1000.0
+            if np.isfinite(d) and d > p.gps_same_eps_m:
+                break
+            j += 1
+        if j >= n:
+            break
+        dt = ts[j] - ts[anchor]
+        if p.gps_min_span_s < dt <= p.gps_max_span_s:
+            out[anchor + 1:j + 1] = haversine_km(lat[anchor], lon[anchor], lat[j], lon[j]) / dt * 3600.0
+        anchor = j
+    dt1 = ts - np.r_[np.nan, ts[:-1]]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        v1 = haversine_km(np.r_[np.nan, lat[:-1]], np.r_[np.nan, lon[:-1]], lat, lon) / dt1 * 3600.0
+    v1[(dt1 <= 0) | (dt1 > p.gap_s)] = np.nan
+    fill = np.isnan(out) & np.isfinite(v1)
+    out[fill] = v1[fill]
+    return out
+
+
+def test_gps_speed_matches_scalar_reference(fleet_flat):
+    p = FeatureParams()
+    trip = fleet_flat[fleet_flat["tripId"] == "trip-0"].reset_index(drop=True)
+    lat = trip["gps_latitude"].to_numpy(dtype=float)
+    lon = trip["gps_longitude"].to_numpy(dtype=float)
+    lat[200:230] = np.nan  # втрата фіксу
+    ts = pd.to_datetime(trip["timestamp"], utc=True).astype("int64").to_numpy() / 1e9
+    start = np.zeros(len(lat), dtype=int)
+    end = np.full(len(lat), len(lat) - 1)
+
+    got = gps_speed_kmh(lat, lon, ts, start, end, p)
+    np.testing.assert_allclose(got, _reference_gps_speed(lat, lon, ts, p), rtol=1e-9, equal_nan=True)
+
+
+def test_rolling_helpers_match_pandas(fleet_flat):
+    df = fleet_flat.sort_values(["tripId", "timestamp"]).reset_index(drop=True)
+    x = df["obd_rpm"].to_numpy(dtype=float)
+    x[::17] = np.nan
+    start, end = _bounds(pd.factorize(df["tripId"])[0])
+    s = pd.Series(x).groupby(df["tripId"], sort=False)
+
+    np.testing.assert_allclose(rolling_mean(x, start, end, 4),
+                               s.transform(lambda g: g.rolling(5, min_periods=1).mean()), equal_nan=True)
+    np.testing.assert_allclose(rolling_std(x, start, end, 4),
+                               s.transform(lambda g: g.rolling(5, min_periods=1).std()),
+                               rtol=1e-7, atol=1e-9, equal_nan=True)
+    np.testing.assert_allclose(rolling_median(x, start, end, 2, 2, min_periods=2),
+                               s.transform(lambda g: g.rolling(5, center=True, min_periods=2).median()),
+                               equal_nan=True)
+
+
+def test_train_serve_parity(fleet_flat):
+    p = FeatureParams()
+    train, cols = build_training_features(fleet_flat, p)
+    serve = build_serving_features(fleet_flat, p)
+
+    assert cols == FEATURE_COLS
+    assert len(train) == len(serve)
+    medians = train[cols].median()
+    np.testing.assert_allclose(serve[cols].fillna(medians).to_numpy(), train[cols].to_numpy(), rtol=1e-12)
+
+
+def test_lean_matrix_matches_serving_features():
+    raw = synthetic_fleet(n_trips=3, n=1500, seed=11).sample(frac=1.0, random_state=0)  # перемішані рядки
+    ref = build_serving_features(flatten_samples(raw))
+    cols = FEATURE_COLS[::-1] + ["unknown"]
+
+    X, aux = build_serving_matrix(raw, cols)
+    assert X.dtype == np.float32 and X.shape == (len(ref), len(cols))
+    assert np.isnan(X[:, -1]).all()
+    np.testing.assert_allclose(X[:, :-1], ref[cols[:-1]].to_numpy(), rtol=1e-4, atol=1e-4, equal_nan=True)
+    np.testing.assert_allclose(aux["ts"], ref["timestamp"].astype("int64").to_numpy() / 1e9)
+
+
+def test_duplicate_timestamps_give_finite_features(fleet_flat):
+    df = pd.concat([fleet_flat, fleet_flat.iloc[::10]], ignore_index=True)
+    serve = build_serving_features(df)
+    assert not np.isinf(serve[FEATURE_COLS].to_numpy()).any()
+
+
+def test_serving_throughput():
+    df = flatten_samples(synthetic_fleet(n_trips=10, n=5000, seed=1))
+    t0 = time.perf_counter()
+    out = build_serving_features(df)
+    rows_per_s = len(out) / (time.perf_counter() - t0)
+    assert len(out) == len(df)
+    assert rows_per_s > 20_000, f"feature engine too slow: {rows_per_s:.0f} rows/s"
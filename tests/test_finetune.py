@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from bson import ObjectId
+from joblib import dump
+
+mongomock = pytest.importorskip("mongomock")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "model-trainer"))
+import app  # noqa: E402
+
+COLS = ["a", "b", "c", "d"]
+
+
+def _regression(n=600, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 4))
+    y = np.exp(0.3 * X[:, 0] - 0.2 * X[:, 1]) + 0.05 * rng.random(n)
+    return X, y
+
+
+def _base_model(epochs=30):
+    X, y = _regression(seed=9)
+    model = app.make_model().set_params(regressor__mlp__max_iter=epochs)
+    return model.fit(X, y)
+
+
+def _save_base(root, version, model=None, cols=COLS, status=None, mtime=None):
+    d = root / app.FLEET_DIR / version
+    d.mkdir(parents=True)
+    if model is not None:
+        dump(model, d / "model.joblib")
+        (d / "feature_columns.json").write_text(json.dumps(cols))
+        if mtime is not None:
+            os.utime(d / "model.joblib", (mtime, mtime))
+    if status is not None:
+        (d / "fleet.json").write_text(json.dumps({"version": version, "status": status}))
+    return str(d)
+
+
+def test_reset_training_state_keeps_weights():
+    mlp = _base_model().regressor_.named_steps["mlp"]
+    coefs = [c.copy() for c in mlp.coefs_]
+    assert mlp.loss_curve_ and mlp.validation_scores_
+    app.reset_training_state(mlp)
+    assert mlp.loss_curve_ == [] and mlp.validation_scores_ == []
+    assert mlp._no_improvement_count == 0 and mlp.best_validation_score_ == -np.inf
+    assert all(np.array_equal(a, b) for a, b in zip(coefs, mlp.coefs_))
+
+
+def test_fine_tune_starts_from_base_with_fresh_counters(monkeypatch):
+    monkeypatch.setenv("FINETUNE_LR", "5e-4")
+    base = _base_model()
+    scaler_mean = base.regressor_.named_steps["scaler"].mean_.copy()
+    coefs = [c.copy() for c in base.regressor_.named_steps["mlp"].coefs_]
+    X, y = _regression(seed=1)
+
+    model = app.fit_checkpointed(X, y, None, None, every=0, base_model=base, epochs=7)
+    mlp = model.regressor_.named_steps["mlp"]
+    # епохи бази не рахуються: не більше epochs, лічильники early stopping — лише дотреновування
+    assert 0 < len(mlp.loss_curve_) <= 7 and mlp.n_iter_ == len(mlp.loss_curve_)
+    assert len(mlp.validation_scores_) == len(mlp.loss_curve_)
+    assert mlp.learning_rate_init == 5e-4 and mlp.max_iter == 7 and not mlp.warm_start
+    # скейлер бази фіксований, ваги стартують з бази
+    np.testing.assert_array_equal(model.regressor_.named_steps["scaler"].mean_, scaler_mean)
+    assert not all(np.array_equal(a, b) for a, b in zip(coefs, mlp.coefs_))
+
+
+def test_train_job_fine_tunes_latest_base_for_finetune_epochs(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "MODELS_ROOT", str(tmp_path))
+    monkeypatch.setattr(app, "CHECKPOINT", False)
+    monkeypatch.setenv("FLEET_BASE_VERSION", "latest")
+    monkeypatch.setenv("FINETUNE_EPOCHS", "7")
+    _save_base(tmp_path, "fleet-old", _base_model(), mtime=1_000)
+    _save_base(tmp_path, "fleet-new", _base_model(), mtime=2_000)
+
+    models = mongomock.MongoClient().fleetms.models
+    monkeypatch.setattr(app, "Models", models)
+    manifest = {"_id": ObjectId(), "vehicleId": ObjectId(), "version": "v1",
+                "trainTripsIds": [ObjectId()], "valTripsIds": [ObjectId()]}
+    models.insert_one(manifest)
+    monkeypatch.setattr(app, "prepare_features",
+                        lambda ids, ckpt: (pd.DataFrame({c: [0.0] for c in COLS}), COLS, {}, None))
+    calls = {}
+
+    def train(df_feat, feature_cols, out_dir, **kw):
+        calls.update(kw)
+        return {"mae": 0.0}
+
+    monkeypatch.setattr(app, "train_and_evaluate", train)
+    app.handle_train_job({"modelId": str(manifest["_id"])})
+
+    assert calls["epochs"] == 7 and calls["base_model"] is not None
+    assert calls["base_info"]["version"] == "fleet-new"
+    assert models.find_one()["baseModel"] == "fleet-new"
+
+
+def test_resolve_base_model(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "MODELS_ROOT", str(tmp_path))
+    assert app.resolve_base_model("latest") is None  # каталогу _fleet ще нема
+    model = _base_model(epochs=5)
+    old = _save_base(tmp_path, "fleet-a", model, mtime=1_000)
+    _save_base(tmp_path, "fleet-b", model, status="failed", mtime=3_000)
+    _save_base(tmp_path, "fleet-c", status="training")  # без model.joblib
+
+    assert app.resolve_base_model("latest") == ("fleet-a", old)
+    new = _save_base(tmp_path, "fleet-d", model, status="completed", mtime=2_000)
+    assert app.resolve_base_model("latest") == ("fleet-d", new)
+    assert app.resolve_base_model("fleet-a") == ("fleet-a", old)
+    assert app.resolve_base_model("fleet-x") is None
+    assert app.resolve_base_model("") is None
+
+
+def test_load_base_model_checks_columns(tmp_path):
+    d = _save_base(tmp_path, "fleet-a", _base_model(epochs=5))
+    assert app.load_base_model(d, COLS) is not None
+    assert app.load_base_model(d, COLS[::-1]) is None
+
+
+def test_fleet_job_failure_is_recorded(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "MODELS_ROOT", str(tmp_path))
+    trips = mongomock.MongoClient().fleetms.trips
+    trips.insert_many([{"_id": ObjectId(), "vehicleId": ObjectId(), "status": "completed"} for _ in range(3)])
+    monkeypatch.setattr(app, "Trips", trips)
+    info_path = tmp_path / app.FLEET_DIR / "fleet-1" / "fleet.json"
+
+    monkeypatch.setattr(app, "prepare_features", lambda ids, ckpt: (None, [], {}, "no usable samples"))
+    app.handle_fleet_job({"job": "fleet-base", "version": "fleet-1"})
+    info = json.loads(info_path.read_text())
+    assert info["status"] == "failed" and info["error"] == "no usable samples" and info["trips"] == 3
+
+    def boom(ids, ckpt):
+        raise RuntimeError("mongo went away")
+
+    # failed не вважається готовим: повтор того самого джоба запускається знову
+    monkeypatch.setattr(app, "prepare_features", boom)
+    with pytest.raises(RuntimeError):
+        app.handle_fleet_job({"job": "fleet-base", "version": "fleet-1"})
+    assert json.loads(info_path.read_text())["error"] == "mongo went away"
+
+    monkeypatch.setattr(app, "prepare_features",
+                        lambda ids, ckpt: (pd.DataFrame({c: [0.0] for c in COLS}), COLS, {}, None))
+    monkeypatch.setattr(app, "train_and_evaluate", lambda *a, **kw: {"mae": 0.1})
+    app.handle_fleet_job({"job": "fleet-base", "version": "fleet-1"})
+    info = json.loads(info_path.read_text())
+    assert info["status"] == "completed" and info["metrics"] == {"mae": 0.1} and "error" not in info
+
+    monkeypatch.setattr(app, "train_and_evaluate", lambda *a, **kw: pytest.fail("completed job retrained"))
+    app.handle_fleet_job({"job": "fleet-base", "version": "fleet-1"})
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "predictor-service"))
+import predictor  # noqa: E402
+
+
+class FakeRuntime:
+    """predict_trip висить на gate, поки тест не відпустить."""
+    def __init__(self):
+        self.gate = threading.Event()
+        self.calls = []
+        self.summary = {"fuelUsedL": 1.5}
+        self.store = type("Store", (), {"_cache": {}})()
+
+    def shadow_versions(self, vehicle_id, version, requested=None):
+        return []
+
+    def predict_trip(self, trip_id, vehicle_id, version, force=False, shadow_versions=None):
+        self.calls.append(trip_id)
+        assert self.gate.wait(5)
+        return self.summary, False
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(svc):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), predictor._make_http_handler(svc))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}/predict"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _post(url, body):
+    req = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"),
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def _wait(cond, timeout=5.0):
+    t0 = time.monotonic()
+    while not cond():
+        assert time.monotonic() - t0 < timeout
+        time.sleep(0.01)
+
+
+def test_identical_requests_coalesce_with_own_latency(serve, monkeypatch):
+    waiting = []
+
+    class CountingFuture(Future):
+        def result(self, timeout=None):
+            waiting.append(threading.get_ident())
+            return super().result(timeout)
+
+    monkeypatch.setattr(predictor, "Future", CountingFuture)
+    rt = FakeRuntime()
+    url = serve(predictor.HttpPredictor(rt, max_concurrency=2, timeout_s=5))
+    body = {"tripId": "t1", "vehicleId": "veh", "version": "v1"}
+
+    with ThreadPoolExecutor(4) as pool:
+        first = pool.submit(_post, url, body)
+        _wait(lambda: rt.calls)
+        time.sleep(0.2)  # власник розрахунку чекає довше за решту
+        rest = [pool.submit(_post, url, body) for _ in range(3)]
+        _wait(lambda: len(waiting) == 3)  # усі троє чекають на спільний Future
+        rt.gate.set()
+        owner, others = first.result(), [f.result() for f in rest]
+
+    assert rt.calls == ["t1"]
+    assert owner[0] == 200 and "coalesced" not in owner[1]
+    assert all(code == 200 and out["coalesced"] for code, out in others)
+    assert all(out["predictionSummary"] == rt.summary for _, out in [owner] + others)
+    # latencyMs — власний у кожного: власник чекав щонайменше на 200 мс довше
+    assert all(out["latencyMs"] + 150 < owner[1]["latencyMs"] for _, out in others)
+    assert "latencyMs" not in rt.summary
+
+
+def test_busy_slots_return_503(serve):
+    rt = FakeRuntime()
+    url = serve(predictor.HttpPredictor(rt, max_concurrency=1, timeout_s=0.3))
+
+    with ThreadPoolExecutor(2) as pool:
+        busy = pool.submit(_post, url, {"tripId": "t1", "vehicleId": "veh", "version": "v1"})
+        _wait(lambda: rt.calls)
+        code, out = _post(url, {"tripId": "t2", "vehicleId": "veh", "version": "v1"})
+        rt.gate.set()
+        assert busy.result()[0] == 200
+
+    assert code == 503 and "busy" in out["error"]
+    assert rt.calls == ["t1"]
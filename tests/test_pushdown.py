@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pandas as pd
+import pytest
+from bson import ObjectId
+
+from fleetml.features import flatten_samples
+from fleetml.resample import BUCKET_FIELDS, bucket_average
+from fleetml.synthetic import synthetic_trip
+
+mongomock = pytest.importorskip("mongomock")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "model-trainer"))
+import app  # noqa: E402
+
+
+def _canon(df):
+    df = df.assign(tripId=df["tripId"].astype(str), timestamp=pd.to_datetime(df["timestamp"], utc=True))
+    return df[["tripId", "timestamp"] + BUCKET_FIELDS].sort_values(["tripId", "timestamp"]).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("bucket_s", [0.0, 2.0, 5.0])
+def test_local_windows_match_mongo_pipeline(monkeypatch, bucket_s):
+    db = mongomock.MongoClient().fleetms
+    monkeypatch.setattr(app, "Samples", db.samples)
+    t1, t2 = ObjectId(), ObjectId()
+    rows = synthetic_trip(400, trip_id=t1, seed=1) + synthetic_trip(250, trip_id=t2, seed=2)
+    rows[5]["obd"].pop("fuelConsumptionRate")
+    rows[7]["gps"]["latitude"] = None
+    rows[9]["obd"]["engineRpm"] = None  # пропуск у полі, що усереднюється
+    db.samples.insert_many(rows)
+
+    mongo = app._aggregate_raw_samples([t1, t2], pushdown=True, bucket_s=bucket_s)
+    local = bucket_average(flatten_samples(pd.json_normalize(list(db.samples.find({}, {"_id": 0})))), bucket_s)
+
+    assert len(local) == len(mongo) < 650
+    pd.testing.assert_frame_equal(_canon(local), _canon(mongo), check_exact=False, rtol=1e-9)
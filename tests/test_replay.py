@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import struct
+
+import numpy as np
+import pandas as pd
+
+from fleetml.features import flatten_samples
+from fleetml.replay import RECORD_SIZE, data_frames, decode_records, encode_records
+from fleetml.synthetic import synthetic_trip
+
+
+def test_records_match_backend_layout_and_round_trip():
+    df = flatten_samples(pd.json_normalize(synthetic_trip(200, seed=3)))
+    rec = encode_records(df)
+    assert rec.dtype.itemsize == RECORD_SIZE
+
+    # розкладка як у handleDataMessage: u64 ts, i32 lon/lat/alt, шість u16 (BE)
+    ts, lon, lat, alt, speed, rpm, _, _, _, fuel = struct.unpack(">QiiiHHHHHH", rec[:1].tobytes())
+    assert lon == round(df["gps_longitude"].iloc[0] * 1e7) and lat == round(df["gps_latitude"].iloc[0] * 1e7)
+    assert rpm == round(df["obd_rpm"].iloc[0]) and fuel == round(df["fuelRate"].iloc[0] * 100)
+
+    frames = data_frames(rec)
+    assert [f[0] & 0x3F for f in frames] == [63, 63, 63, 11] and all(f[0] & 0x80 for f in frames)
+
+    back = decode_records(b"".join(f[1:] for f in frames))
+    assert len(back) == len(df)
+    np.testing.assert_allclose(back["gps_latitude"], df["gps_latitude"], atol=1e-7)
+    np.testing.assert_allclose(back["obd_speed"], df["obd_speed"], atol=0.01)
+    np.testing.assert_allclose(back["fuelRate"], df["fuelRate"], atol=0.01)
+    assert (back["timestamp"].to_numpy() == df["timestamp"].dt.tz_localize(None).dt.floor("ms").to_numpy()).all()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+from fleetml.resample import resample_fixed_rate
+
+T0 = pd.Timestamp("2024-05-01T08:00:00Z")
+
+
+def _frame(trip, seconds, values, labels=None):
+    return pd.DataFrame({
+        "tripId": trip,
+        "timestamp": [T0 + pd.Timedelta(seconds=s) for s in seconds],
+        "fuelRate": values,
+        "label": labels if labels is not None else ["x"] * len(seconds),
+    })
+
+
+def test_duplicate_timestamps_collapse_to_mean():
+    df = _frame("t1", [0.0, 0.0, 0.2, 1.0], [1.0, 3.0, 5.0, 7.0])
+    out = resample_fixed_rate(df, period_s=1.0)
+    assert list(out.columns) == list(df.columns)
+    assert len(out) == 2
+    np.testing.assert_allclose(out["fuelRate"], [3.0, 7.0])
+    assert list(out["timestamp"]) == [T0, T0 + pd.Timedelta(seconds=1)]
+
+
+def test_short_holes_interpolated_long_holes_kept():
+    # дірка 3 с (<= gap_s) добудовується, дірка 10 с лишається розривом
+    df = _frame("t1", [0, 1, 4, 5, 15], [0.0, 1.0, 4.0, 5.0, 15.0])
+    out = resample_fixed_rate(df, period_s=1.0, gap_s=6.0)
+    secs = ((out["timestamp"] - T0).dt.total_seconds()).tolist()
+    assert secs == [0, 1, 2, 3, 4, 5, 15]
+    np.testing.assert_allclose(out["fuelRate"], [0, 1, 2, 3, 4, 5, 15])
+
+
+def test_non_numeric_columns_keep_first_value():
+    df = _frame("t1", [0.0, 0.5, 3.0], [1.0, 2.0, 3.0], labels=["a", "b", "c"])
+    out = resample_fixed_rate(df, period_s=1.0, gap_s=6.0)
+    # перше значення в біні; інтерпольовані біни беруть значення попереднього
+    assert out["label"].tolist() == ["a", "a", "a", "c"]
+
+
+def test_trips_stay_separate():
+    a = _frame("a", [0, 1, 2], [1.0, 1.0, 1.0])
+    b = _frame("b", [1, 2, 3], [9.0, 9.0, 9.0])
+    out = resample_fixed_rate(pd.concat([b, a], ignore_index=True), period_s=1.0, gap_s=6.0)
+    assert out["tripId"].tolist() == ["b"] * 3 + ["a"] * 3
+    # спільні секунди різних трипів не зливаються і не інтерполюються між трипами
+    assert (out.loc[out["tripId"] == "a", "fuelRate"] == 1.0).all()
+    assert (out.loc[out["tripId"] == "b", "fuelRate"] == 9.0).all()
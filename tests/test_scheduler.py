@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "predictor-service"))
+from predictor import PriorityScheduler  # noqa: E402
+
+
+async def _settle():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def test_weighted_round_robin_ratio():
+    async def go():
+        sched = PriorityScheduler({"live": (3, 1), "backfill": (1, 1)}, max_workers=1)
+        order = []
+
+        async def handler(cls, msg):
+            order.append(cls)
+            await asyncio.sleep(0)
+
+        for i in range(40):
+            await sched.submit("live", i)
+            await sched.submit("backfill", i)
+        runner = asyncio.create_task(sched.run(handler))
+        while len(order) < 20:
+            await asyncio.sleep(0)
+        runner.cancel()
+        await sched.shutdown()
+        return order[:20]
+
+    order = asyncio.run(go())
+    assert order.count("live") == 15 and order.count("backfill") == 5
+    # smooth WRR: backfill не чекає, поки live вичерпається
+    assert "backfill" in order[:4]
+
+
+def _blocking_run(classes, max_workers, submits):
+    async def go():
+        sched = PriorityScheduler(classes, max_workers=max_workers)
+        release = asyncio.Event()
+
+        async def handler(cls, msg):
+            await release.wait()
+
+        for cls, n in submits.items():
+            for i in range(n):
+                await sched.submit(cls, SimpleNamespace(timestamp=None))
+        runner = asyncio.create_task(sched.run(handler))
+        await _settle()
+        inflight = dict(sched.inflight)
+        tasks = len(sched._tasks)
+        runner.cancel()
+        await sched.shutdown()
+        return inflight, tasks, dict(sched.inflight), sched
+
+    return asyncio.run(go())
+
+
+def test_class_and_global_limits():
+    inflight, tasks, _, _ = _blocking_run({"live": (4, 2), "backfill": (1, 2)}, 3, {"live": 5, "backfill": 5})
+    assert inflight["live"] == 2 and inflight["backfill"] == 1 and tasks == 3
+
+
+def test_idle_class_leaves_its_share_to_others():
+    inflight, _, _, _ = _blocking_run({"live": (4, 2), "backfill": (1, 2)}, 2, {"backfill": 5})
+    assert inflight == {"live": 0, "backfill": 2}
+
+
+def test_shutdown_cancels_in_flight_tasks():
+    _, tasks, after, sched = _blocking_run({"live": (1, 2)}, 2, {"live": 3})
+    assert tasks == 2 and after == {"live": 0} and not sched._tasks
+    snap = sched.snapshot()["live"]
+    assert snap["pending"] == 1 and snap["done"] == 0 and snap["failed"] == 0
+
+
+def test_snapshot_separates_local_wait_from_publish_age():
+    async def go():
+        sched = PriorityScheduler({"live": (1, 1)}, max_workers=1)
+        done = asyncio.Event()
+
+        async def handler(cls, msg):
+            done.set()
+
+        published = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=30)
+        await sched.submit("live", SimpleNamespace(timestamp=published))
+        runner = asyncio.create_task(sched.run(handler))
+        await done.wait()
+        await _settle()
+        runner.cancel()
+        await sched.shutdown()
+        return sched.snapshot()["live"]
+
+    snap = asyncio.run(go())
+    assert snap["done"] == 1 and snap["localWaitMaxS"] < 1.0 and 29.0 < snap["publishAgeMaxS"] < 40.0
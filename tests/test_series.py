@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from fleetml.series import build_series_levels, decode_level, lttb_indices, minmax_indices
+
+
+def test_decimation_keeps_endpoints_and_peaks():
+    x = np.arange(10_000, dtype=float)
+    y = np.sin(x / 400.0)
+    y[4321] = 25.0  # одиночний пік
+
+    idx = lttb_indices(x, y, 500)
+    assert len(idx) == 500 and idx[0] == 0 and idx[-1] == len(x) - 1
+    assert np.all(np.diff(idx) > 0)
+    assert 4321 in idx
+    assert 4321 in minmax_indices(y, 500)
+
+
+def test_series_levels_round_trip():
+    t = np.arange(0, 2_000_000, 1000, dtype=np.int64)
+    pred = np.linspace(0.0, 2.0, len(t))
+    actual = pred + 0.1
+    actual[::3] = np.nan
+
+    levels = build_series_levels(t, pred, actual, levels=(100, 5000, 9000))
+    assert [lv["points"] for lv in levels] == [100, len(t)]  # 9000 зводиться до повного ряду
+
+    full = decode_level(levels[-1])
+    np.testing.assert_array_equal(full["t"], t)
+    np.testing.assert_allclose(full["pred"], pred, rtol=1e-6)
+    np.testing.assert_array_equal(np.isnan(full["actual"]), np.isnan(actual))
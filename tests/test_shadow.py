@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from bson import ObjectId
+
+from fleetml.synthetic import synthetic_trip
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "predictor-service"))
+import predictor  # noqa: E402
+
+
+class LinearModel:
+    def __init__(self, w, b):
+        self.w, self.b = np.asarray(w, dtype=float), b
+
+    def predict(self, X):
+        return np.asarray(X, dtype=float) @ self.w + self.b
+
+
+@pytest.mark.parametrize("lean", ["0", "1"])
+def test_shared_features_match_solo_summaries(monkeypatch, lean):
+    monkeypatch.setenv("DRIFT_MONITOR", "0")
+    monkeypatch.setenv("PREDICT_LEAN", lean)
+    rt = predictor.PredictorRuntime("mongodb://localhost:1", "fleetms", "/nonexistent")
+    df_raw = pd.json_normalize(synthetic_trip(900, trip_id=ObjectId(), seed=4))
+
+    cols_a = ["speedKmh", "accel_ms2", "obd_rpm", "obd_throttle"]
+    cols_b = ["obd_rpm", "speedKmh_mean5", "grade", "coolantC"]
+    pkgs = {
+        "v1": {"model": LinearModel([0.01, 0.3, 0.0004, 0.02], 0.1), "feature_cols": cols_a,
+               "meta": {"fill_values": {c: 0.0 for c in cols_a}}},
+        "v2": {"model": LinearModel([0.0005, 0.012, 2.0, 0.001], 0.05), "feature_cols": cols_b,
+               "meta": {"fill_values": {"grade": 0.0, "coolantC": 85.0}}},
+    }
+    shared = rt.score_versions(df_raw, "veh", pkgs, with_series=True)
+
+    for version, pkg in pkgs.items():
+        series = {}
+        solo = predictor.compute_prediction_summary(
+            df_raw, pkg["model"], pkg["feature_cols"], resample_hz=rt.resample_hz, gap_s=rt.params.gap_s,
+            params=rt.params, fill_values=pkg["meta"]["fill_values"], motion_kmh=rt.motion_kmh,
+            distance_bucket_km=rt.distance_bucket_km, series=series, lean=rt.lean)
+        summary, shared_series = shared[version]
+        assert summary == solo
+        for k in ("t_ms", "pred", "actual"):
+            # lean: predict по зрізу спільної матриці — різниця лише в останньому біті
+            np.testing.assert_allclose(shared_series[k], series[k], rtol=1e-12)
+    assert shared["v1"][0] != shared["v2"][0]
+
+
+def test_lean_debug_artifacts_get_features_before_fill(monkeypatch, caplog):
+    monkeypatch.setenv("DEBUG_SAVE", "1")
+    submitted = {}
+
+    class Writer:
+        def submit(self, trip_id, X, df_raw, meta):
+            submitted["X"] = X.copy()
+
+    monkeypatch.setattr(predictor, "debug_writer", lambda ddir=None: Writer())
+    df_raw = pd.json_normalize(synthetic_trip(300, trip_id=ObjectId(), seed=2))
+    cols = ["speedKmh", "obd_rpm", "mystery"]
+    with caplog.at_level("WARNING", logger=predictor.logger.name):
+        batch = predictor.build_feature_batch(df_raw, cols, lean=True)
+    assert "filled with training medians" in caplog.text
+
+    predictor.score_feature_batch(batch, LinearModel([0.01, 0.0004, 1.0], 0.1), cols,
+                                  fill_values={"mystery": 7.0}, exclusive=True)
+    # артефакт — до заповнення (як у не-lean шляху), а спільна матриця заповнена на місці
+    assert submitted["X"]["mystery"].isna().all()
+    assert (batch["X"]["mystery"] == 7.0).all()
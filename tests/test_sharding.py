@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+import datetime
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from fleetml.sharding import HOPS_HEADER, MAX_HOPS, HashRing, ShardMembership, next_hops, shard_queue
+
+mongomock = pytest.importorskip("mongomock")
+
+KEYS = [f"veh-{i}" for i in range(5000)]
+
+
+def _owners(ring):
+    return {k: ring.owner(k) for k in KEYS}
+
+
+def test_ring_is_stable_and_moves_few_keys():
+    ring = HashRing(["a", "b", "c"])
+    before = _owners(ring)
+    assert before == _owners(HashRing(["c", "a", "b", "a"]))  # порядок і дублікати не важать
+    shares = [list(before.values()).count(n) / len(KEYS) for n in "abc"]
+    assert min(shares) > 0.2
+
+    grown = _owners(HashRing(["a", "b", "c", "d"]))
+    moved = [k for k in KEYS if grown[k] != before[k]]
+    # переїжджають лише ключі нового вузла, ~1/4
+    assert all(grown[k] == "d" for k in moved) and 0.15 < len(moved) / len(KEYS) < 0.35
+
+    shrunk = _owners(HashRing(["a", "c"]))
+    assert all(shrunk[k] == before[k] for k in KEYS if before[k] != "b")
+    assert HashRing([]).owner("x") is None
+
+
+def _members(col, ids, group="predictor", **kw):
+    ms = [ShardMembership(col, group, replica_id=r, **kw) for r in ids]
+    for m in ms:
+        m._beat()
+    for m in ms:
+        m.refresh()
+    return ms
+
+
+def test_replicas_agree_on_ownership_and_leader():
+    col = mongomock.MongoClient().db.shard_members
+    ms = _members(col, ["r2", "r1", "r3"])
+    for k in KEYS[:500]:
+        mine = [m.replica_id for m in ms if m.is_mine(k)]
+        assert len(mine) == 1 and all(m.owner(k) == mine[0] for m in ms)
+    assert [m.replica_id for m in ms if m.is_leader()] == ["r1"]
+
+
+def test_orphans_are_stale_or_leaving_members_only():
+    col = mongomock.MongoClient().db.shard_members
+    r1, r2, r3, r4 = _members(col, ["r1", "r2", "r3", "r4"], ttl_s=30.0)
+    col.update_one({"_id": "predictor:r3"},
+                   {"$set": {"heartbeatAt": datetime.datetime.utcnow() - datetime.timedelta(seconds=60)}})
+    r4._stop.set()
+    col.update_one({"_id": "predictor:r4"}, {"$set": {"leaving": True}})
+    for m in (r1, r2):
+        m.refresh()
+    assert sorted(r1.orphans()) == ["r3", "r4"] and r1.ring.nodes == ["r1", "r2"]
+    assert r2.orphans() == []  # дренує лише лідер
+    assert all(r1.owner(k) in ("r1", "r2") for k in KEYS[:200])
+
+    r1.forget("r3")
+    r1.forget("r1")  # себе не видаляє
+    assert sorted(d["replicaId"] for d in col.find()) == ["r1", "r2", "r4"]
+
+
+def test_hops_are_limited():
+    assert next_hops(None) == 1 and next_hops({HOPS_HEADER: 2}) == 3
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "model-trainer"))
+    import app
+
+    col = mongomock.MongoClient().db.shard_members
+    me, other = _members(col, ["me", "other"])
+    app.SHARDING = me
+    try:
+        key = next(k for k in KEYS if not me.is_mine(k))
+        props = SimpleNamespace(headers={})
+        assert app.shard_owner({"vehicleId": key}, props) == "other"
+        props.headers[HOPS_HEADER] = MAX_HOPS
+        assert app.shard_owner({"vehicleId": key}, props) is None  # обробляємо тут, без пінг-понгу
+    finally:
+        app.SHARDING = None
+
+
+class _Chan:
+    def __init__(self, broker, consumers=0, fail_publish=False):
+        self.broker, self.consumers, self.fail_publish = broker, consumers, fail_publish
+        self.is_open = True
+        self.acked, self.nacked = [], []
+
+    def queue_declare(self, queue, durable=True, passive=False):
+        if passive and queue not in self.broker:
+            raise RuntimeError("NOT_FOUND")
+        self.broker.setdefault(queue, [])
+        return SimpleNamespace(method=SimpleNamespace(consumer_count=self.consumers))
+
+    def basic_get(self, queue, auto_ack=False):
+        q = self.broker[queue]
+        if not q:
+            return None, None, None
+        body = q.pop(0)
+        return SimpleNamespace(delivery_tag=body), SimpleNamespace(headers={}, content_type=None), body
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        if self.fail_publish:
+            raise RuntimeError("channel closed")
+        self.broker[routing_key].append(body)
+
+    def basic_ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+
+    def basic_nack(self, delivery_tag, requeue):
+        self.nacked.append(delivery_tag)
+        self.broker[self._q].insert(0, delivery_tag)
+
+    def queue_delete(self, queue, if_unused=False, if_empty=False):
+        assert if_unused and if_empty
+        del self.broker[queue]
+
+    def close(self):
+        self.is_open = False
+
+
+@pytest.mark.parametrize("case", ["drained", "consumed", "forward_fails"])
+def test_trainer_drain_skips_live_queues_and_keeps_failed_messages(case):
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "model-trainer"))
+    import app
+
+    col = mongomock.MongoClient().db.shard_members
+    leader, _ = _members(col, ["a-leader", "z-gone"], group="trainer")
+    col.update_one({"_id": "trainer:z-gone"}, {"$set": {"leaving": True}})
+    leader.refresh()
+    assert leader.orphans() == ["z-gone"]
+
+    orphan_q = shard_queue(app.QUEUE_IN, "z-gone")
+    bodies = [json.dumps({"vehicleId": k}).encode() for k in KEYS[:5]]
+    broker = {orphan_q: list(bodies), shard_queue(app.QUEUE_IN, "a-leader"): []}
+    tmp = _Chan(broker, consumers=1 if case == "consumed" else 0)
+    tmp._q = orphan_q
+    main = _Chan(broker, fail_publish=case == "forward_fails")
+    conn = SimpleNamespace(channel=lambda: tmp, call_later=lambda *a: None)
+    app.SHARDING = leader
+    try:
+        app.drain_orphan_shards(conn, main)
+    finally:
+        app.SHARDING = None
+
+    remaining = {d["replicaId"] for d in col.find()}
+    if case == "drained":
+        assert orphan_q not in broker and broker[shard_queue(app.QUEUE_IN, "a-leader")] == bodies
+        assert remaining == {"a-leader"}
+    else:
+        # жива черга / невдала пересилка: повідомлення лишаються, репліка не забута
+        assert broker[orphan_q] == bodies and "z-gone" in remaining
+        assert tmp.nacked == ([bodies[0]] if case == "forward_fails" else [])
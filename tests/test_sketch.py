@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from fleetml.sketch import FeatureSketch, drift_scores, psi
+
+
+def test_sketch_batches_match_single_pass():
+    x = np.random.default_rng(0).normal(10.0, 2.0, 50_000)
+    x[::100] = np.nan
+    ref = FeatureSketch.fit(x, bins=20)
+
+    cur = ref.empty_like()
+    for part in np.array_split(x, 9):
+        cur.update(part)
+    assert (cur.hist == ref.hist).all() and cur.nan == ref.nan == 500
+    assert abs(cur.mean - np.nanmean(x)) < 1e-9 and abs(cur.std - np.nanstd(x, ddof=1)) < 1e-9
+    for q in (0.1, 0.5, 0.9):
+        assert abs(cur.quantile(q) - np.nanquantile(x, q)) < 0.05
+
+    round_trip = FeatureSketch.from_dict(cur.to_dict())
+    assert psi(ref, round_trip) < 1e-9
+
+
+def test_drift_flags_shifted_feature():
+    rng = np.random.default_rng(1)
+    ref = {"a": FeatureSketch.fit(rng.normal(size=20_000)), "b": FeatureSketch.fit(rng.normal(size=20_000))}
+    cur = {"a": ref["a"].empty_like().update(rng.normal(size=5_000)),
+           "b": ref["b"].empty_like().update(rng.normal(1.5, 1.0, size=5_000))}
+    d = drift_scores(ref, cur)
+    assert d["features"]["a"]["psi"] < 0.05
+    assert d["features"]["b"]["psi"] > 0.5 and d["maxPsi"] == d["features"]["b"]["psi"]
+    assert abs(d["features"]["b"]["meanShiftSd"] - 1.5) < 0.1
+
+
+def test_merge_equals_single_pass():
+    x = np.random.default_rng(2).normal(5.0, 3.0, 30_000)
+    x[::50] = np.nan
+    ref = FeatureSketch.fit(x)
+    parts = [ref.empty_like().update(p) for p in np.array_split(x, 3)]
+    merged = parts[0].empty_like()
+    for p in parts:
+        merged.merge(FeatureSketch.from_dict(p.to_dict()))
+    assert (merged.hist == ref.hist).all() and merged.n == ref.n and merged.nan == ref.nan
+    assert abs(merged.mean - ref.mean) < 1e-9 and abs(merged.std - ref.std) < 1e-9
+    assert merged.min == ref.min and merged.max == ref.max
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+from fleetml.subsample import resample_by_weight, stratified_subsample
+
+
+def _imbalanced(seed=0):
+    # багато повільних рядків з малою витратою + рідкісні швидкі страти з великою
+    rng = np.random.default_rng(seed)
+    slow = pd.DataFrame({"speedKmh": rng.uniform(0, 9, 5000), "y": rng.normal(1.0, 0.1, 5000)})
+    fast = pd.DataFrame({"speedKmh": rng.uniform(10, 130, 600)})
+    fast["y"] = 1.0 + fast["speedKmh"] / 20 + rng.normal(0, 0.1, len(fast))
+    df = pd.concat([slow, fast], ignore_index=True)
+    df["tripId"] = "t1"
+    df["obd_throttle"] = 20.0
+    df["obd_rpm"] = 1500.0
+    return df
+
+
+def test_weighted_resample_follows_full_distribution():
+    df = _imbalanced()
+    idx, w = stratified_subsample(df, max_per_stratum=50)
+    kept = df["y"].to_numpy()[idx]
+    assert len(idx) < len(df) / 5 and np.isclose(w.sum(), len(df))
+
+    full_mean = df["y"].mean()
+    # без ваг рідкісні страти переоцінені
+    assert kept.mean() - full_mean > 0.5
+
+    rs = resample_by_weight(w)
+    assert len(rs) == len(idx)
+    resampled = kept[rs]
+    assert abs(resampled.mean() - full_mean) < 0.05
+    for q in (0.25, 0.5, 0.75):
+        assert abs(np.quantile(resampled, q) - df["y"].quantile(q)) < 0.05
+
+    # кількість копій рядка пропорційна вазі (систематичний ресемплінг: ±1)
+    counts = np.bincount(rs, minlength=len(w))
+    assert np.all(np.abs(counts - w / w.sum() * len(w)) < 1 + 1e-9)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+from joblib import dump
+
+mongomock = pytest.importorskip("mongomock")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "predictor-service"))
+import predictor  # noqa: E402
+
+
+def _model_dir(root, vehicle, version, cols, model=None, raw=None):
+    d = root / vehicle / version
+    d.mkdir(parents=True)
+    if raw is not None:
+        (d / "model.joblib").write_bytes(raw)
+    else:
+        dump(model, d / "model.joblib")
+    (d / "feature_columns.json").write_text(json.dumps(cols))
+
+
+def test_warm_up_skips_broken_models(monkeypatch, tmp_path):
+    from sklearn.linear_model import LinearRegression
+
+    model = LinearRegression().fit(np.eye(2), [1.0, 2.0])
+    _model_dir(tmp_path, "veh-a", "v1", ["speedKmh", "obd_rpm"], model)
+    _model_dir(tmp_path, "veh-b", "v1", ["speedKmh"], raw=b"not a pickle")  # битий файл
+    _model_dir(tmp_path, "veh-c", "v1", ["speedKmh", "obd_rpm", "grade"], model)  # predict() падає
+
+    monkeypatch.setenv("DRIFT_MONITOR", "0")
+    rt = predictor.PredictorRuntime("mongodb://localhost:1", "fleetms", str(tmp_path))
+    rt.mongo = mongomock.MongoClient()
+    info = rt.warm_up("all")
+
+    assert info["indexedModels"] == 3
+    assert info["warmModels"] == ["veh-a@v1"]
+    assert "veh-a@v1" in rt.store._cache and "veh-b@v1" not in rt.store._cache
+    assert "tripId_1_version_1" in rt.mongo.fleetms[predictor.VERSIONS_COLLECTION].index_information()